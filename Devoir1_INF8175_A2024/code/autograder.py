@@ -20,6 +20,7 @@ import optparse
 import os
 import re
 import sys
+import traceback
 import projectParams
 import random
 random.seed(0)
@@ -80,6 +81,11 @@ def readCommand(argv):
                     dest = 'noGraphics',
                     action = 'store_true',
                     help = 'No graphics display for pacman games.')
+    parser.add_option('--jobs', '-j',
+                    dest = 'jobs',
+                    type = 'int',
+                    default = 1,
+                    help = 'Number of worker processes running the test cases, without graphics.')
     (options, args) = parser.parse_args(argv)
     return options
 
@@ -247,10 +253,65 @@ def getTestSubdirs(testParser, testRoot, questionToGrade):
     return sorted(os.listdir(testRoot))
 
 
+# worker processes of evaluate(jobs=N): each loads the student and test class
+# modules once, then runs test cases with a GradesRecorder in place of Grades
+def initWorker(moduleFiles):
+    global workerModuleDict
+    workerModuleDict = {}
+    for key, moduleName, filePath in moduleFiles:
+        workerModuleDict[key] = loadModuleFile(moduleName, filePath)
+    globals().update(workerModuleDict)
+
+def runTestCaseInWorker(questionDict, test_file, solution_file, test_out_file):
+    """
+    Runs one test case and returns (events, result, exception, traceback):
+    what it did to its grades, its result and the exception it raised, if any.
+    """
+    import pickle
+    import testParser
+    import testClasses
+    import textDisplay
+    random.seed(0)
+    moduleDict = workerModuleDict
+    testDict = testParser.TestParser(test_file).parse()
+    testDict['test_out_file'] = test_out_file
+    solutionDict = testParser.TestParser(solution_file).parse()
+    question = getattr(testClasses, questionDict['class'])(questionDict, textDisplay.NullGraphics())
+    testCase = getattr(projectTestClasses, testDict['class'])(question, testDict)
+
+    recorder = grading.GradesRecorder()
+    result, exception, tb = None, None, None
+    stdout = sys.stdout
+    sys.stdout = recorder
+    try:
+        result = testCase.execute(recorder, moduleDict, solutionDict)
+    except (Exception, SystemExit) as inst:
+        exception, tb = inst, traceback.format_exc()
+        try: pickle.dumps(exception)
+        except Exception: exception = Exception(repr(inst))
+    finally:
+        sys.stdout = stdout
+    return recorder.events, result, exception, tb
+
+def replayTestCase(asyncResult, grades):
+    "Waits for a test case run by a worker and applies its outcome to grades."
+    events, result, exception, tb = asyncResult.get()
+    grading.GradesRecorder.replay(events, grades)
+    if exception != None:
+        raise exception from Exception('Test case failed in a worker process:\n' + tb)
+    return result
+
 # evaluate student code
 def evaluate(generateSolutions, testRoot, moduleDict, exceptionMap=ERROR_HINT_MAP,
              edxOutput=False, muteOutput=False, gsOutput=False,
-            printTestCase=False, questionToGrade=None, display=None):
+            printTestCase=False, questionToGrade=None, display=None, jobs=1):
+    """
+    With jobs > 1, the test cases run ahead in a pool of worker processes
+    while the questions are graded in order here, each test case replaying
+    its recorded output and grades.  The output is thus the same whatever
+    the number of jobs.  Test cases of a question skipped for an incomplete
+    prerequisite still run, but their outcome is dropped.
+    """
     # imports of testbench code.  note that the testClasses import must follow
     # the import of student code due to dependencies
     import testParser
@@ -258,6 +319,12 @@ def evaluate(generateSolutions, testRoot, moduleDict, exceptionMap=ERROR_HINT_MA
     for module in moduleDict:
         setattr(sys.modules[__name__], module, moduleDict[module])
 
+    pool = None
+    if jobs > 1 and not generateSolutions:
+        import multiprocessing
+        moduleFiles = [(key, module.__name__, module.__file__) for key, module in moduleDict.items()]
+        pool = multiprocessing.Pool(jobs, initializer=initWorker, initargs=(moduleFiles,))
+
     questions = []
     questionDicts = {}
     test_subdirs = getTestSubdirs(testParser, testRoot, questionToGrade)
@@ -293,10 +360,16 @@ def evaluate(generateSolutions, testRoot, moduleDict, exceptionMap=ERROR_HINT_MA
                     # read in solution dictionary and pass as an argument
                     testDict = testParser.TestParser(test_file).parse()
                     solutionDict = testParser.TestParser(solution_file).parse()
+                    if pool != None:
+                        asyncResult = pool.apply_async(runTestCaseInWorker,
+                                                       (questionDict, test_file, solution_file, test_out_file))
+                        execute = lambda grades: replayTestCase(asyncResult, grades)
+                    else:
+                        execute = lambda grades: testCase.execute(grades, moduleDict, solutionDict)
                     if printTestCase:
-                        return lambda grades: printTest(testDict, solutionDict) or testCase.execute(grades, moduleDict, solutionDict)
+                        return lambda grades: printTest(testDict, solutionDict) or execute(grades)
                     else:
-                        return lambda grades: testCase.execute(grades, moduleDict, solutionDict)
+                        return execute
             question.addTestCase(testCase, makefun(testCase, solution_file))
 
         # Note extra function is necessary for scoping reasons
@@ -312,7 +385,10 @@ def evaluate(generateSolutions, testRoot, moduleDict, exceptionMap=ERROR_HINT_MA
             for prereq in questionDicts[q].get('depends', '').split():
                 grades.addPrereq(q, prereq)
 
-    grades.grade(sys.modules[__name__], bonusPic = projectParams.BONUS_PIC)
+    try:
+        grades.grade(sys.modules[__name__], bonusPic = projectParams.BONUS_PIC)
+    finally:
+        if pool != None: pool.terminate()
     return grades.points
 
 
@@ -359,4 +435,5 @@ if __name__ == '__main__':
         evaluate(options.generateSolutions, options.testRoot, moduleDict,
             gsOutput=options.gsOutput,
             edxOutput=options.edxOutput, muteOutput=options.muteOutput, printTestCase=options.printTestCase,
-            questionToGrade=options.gradeQuestion, display=getDisplay(options.gradeQuestion!=None, options))
+            questionToGrade=options.gradeQuestion, display=getDisplay(options.gradeQuestion!=None, options),
+            jobs=options.jobs)
@@ -22,8 +22,10 @@
 
 from util import *
 import time, os
+import random
 import traceback
 import sys
+import struct
 
 #######################
 # Parts worth reading #
@@ -53,6 +55,10 @@ class Directions:
     WEST = 'West'
     STOP = 'Stop'
 
+    # The order in which the directions are numbered in binary records
+    AS_LIST = [NORTH, SOUTH, EAST, WEST, STOP]
+    INDEX = dict((direction, i) for i, direction in enumerate(AS_LIST))
+
     LEFT =       {NORTH: WEST,
                    SOUTH: EAST,
                    EAST:  NORTH,
@@ -190,6 +196,7 @@ class Grid:
 
     def __eq__(self, other):
         if other == None: return False
+        if isinstance(other, BitGrid): return other == self
         return self.data == other.data
 
     def __hash__(self):
@@ -232,47 +239,178 @@ class Grid:
 
         (width, height, bitPackedInts...)
         """
-        bits = [self.width, self.height]
-        currentInt = 0
-        for i in range(self.height * self.width):
-            bit = self.CELLS_PER_INT - (i % self.CELLS_PER_INT) - 1
-            x, y = self._cellIndexToPosition(i)
-            if self[x][y]:
-                currentInt += 2 ** bit
-            if (i + 1) % self.CELLS_PER_INT == 0:
-                bits.append(currentInt)
-                currentInt = 0
-        bits.append(currentInt)
-        return tuple(bits)
+        size = self.width * self.height
+        digits = self._cellDigits().ljust((size // self.CELLS_PER_INT + 1) * self.CELLS_PER_INT, '0')
+        return (self.width, self.height) + tuple([int(digits[i:i + self.CELLS_PER_INT], 2)
+                                                  for i in range(0, len(digits), self.CELLS_PER_INT)])
 
     def _cellIndexToPosition(self, index):
         x = index // self.height
         y = index % self.height
         return x, y
 
+    def _cellDigits(self):
+        "The cells as a string of '0' and '1', in the order of _cellIndexToPosition."
+        return b''.join([bytes(column) for column in self.data]).translate(_CELLS_TO_DIGITS).decode('ascii')
+
     def _unpackBits(self, bits):
         """
         Fills in data from a bit-level representation
         """
-        cell = 0
         for packed in bits:
-            for bit in self._unpackInt(packed, self.CELLS_PER_INT):
-                if cell == self.width * self.height: break
-                x, y = self._cellIndexToPosition(cell)
-                self[x][y] = bit
-                cell += 1
-
-    def _unpackInt(self, packed, size):
-        bools = []
-        if packed < 0: raise ValueError("must be a positive integer")
-        for i in range(size):
-            n = 2 ** (self.CELLS_PER_INT - i - 1)
-            if packed >= n:
-                bools.append(True)
-                packed -= n
-            else:
-                bools.append(False)
-        return bools
+            if packed < 0: raise ValueError("must be a positive integer")
+        digits = ''.join([format(packed, '0%db' % self.CELLS_PER_INT) for packed in bits])
+        self._setCellDigits(digits[:self.width * self.height].ljust(self.width * self.height, '0'))
+
+    def _setCellDigits(self, digits):
+        height = self.height
+        self.data = [[digit == '1' for digit in digits[x * height:(x + 1) * height]] for x in range(self.width)]
+
+    def toBytes(self):
+        """
+        Returns the grid as bytes: width and height as two little-endian
+        unsigned shorts, then the cells packed eight per byte in the bit
+        order of BitGrid.  See gridFromBytes.
+        """
+        size = self.width * self.height
+        return struct.pack('<HH', self.width, self.height) + self.asBitGrid().bits.to_bytes((size + 7) // 8, 'little')
+
+    def asBitGrid(self):
+        """
+        Returns a BitGrid holding the same cells as this boolean grid.
+        """
+        digits = self._cellDigits()
+        return BitGrid(self.width, self.height, bits=int(digits[::-1], 2) if digits else 0)
+
+# bytes(column) of a column of booleans is made of 0 and 1 bytes
+_CELLS_TO_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+
+if hasattr(int, 'bit_count'):
+    _popcount = int.bit_count
+else:
+    _popcount = lambda bits: bin(bits).count('1')
+
+class BitGrid(Grid):
+    """
+    A boolean Grid stored as a single Python int, the cell (x,y) being the bit
+    x * height + y.  It is accessed via grid[x][y] like a Grid, but copy() is
+    O(1) (ints are immutable, a copy shares the bits until one of them is
+    written), count() is a popcount, asList() only visits the set bits and the
+    hash is computed once per content.
+
+    The bit order is the one used by Grid.__hash__ and Grid.packBits, so a
+    BitGrid hashes and compares equal to a Grid holding the same cells.
+    """
+    def __init__(self, width, height, initialValue=False, bitRepresentation=None, bits=0):
+        if initialValue not in [False, True]: raise Exception('Grids can only contain booleans')
+        self.CELLS_PER_INT = 30
+
+        self.width = width
+        self.height = height
+        self._mask = (1 << (width * height)) - 1
+        self.bits = self._mask if initialValue else bits
+        self._hash = None
+        if bitRepresentation:
+            self._unpackBits(bitRepresentation)
+
+    def __getitem__(self, i):
+        if i < 0: i += self.width
+        if not 0 <= i < self.width: raise IndexError('BitGrid index out of range')
+        return _BitGridColumn(self, i)
+
+    def __setitem__(self, key, item):
+        column = self[key]
+        for y in range(self.height):
+            column[y] = item[y]
+
+    def __len__(self):
+        return self.width
+
+    def __str__(self):
+        out = [[str(self[x][y])[0] for x in range(self.width)] for y in range(self.height)]
+        out.reverse()
+        return '\n'.join([''.join(x) for x in out])
+
+    def __eq__(self, other):
+        if other == None: return False
+        if not isinstance(other, BitGrid):
+            if not isinstance(other, Grid): return False
+            other = other.asBitGrid()
+        return self.bits == other.bits and self.height == other.height and self.width == other.width
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(self.bits)
+        return self._hash
+
+    def get(self, x, y):
+        return (self.bits >> (x * self.height + y)) & 1 == 1
+
+    def set(self, x, y, value):
+        bit = 1 << (x * self.height + y)
+        if value:
+            self.bits |= bit
+        else:
+            self.bits &= ~bit
+        self._hash = None
+
+    def copy(self):
+        g = BitGrid(self.width, self.height, bits=self.bits)
+        g._hash = self._hash
+        return g
+
+    def deepCopy(self):
+        return self.copy()
+
+    def shallowCopy(self):
+        return self.copy()
+
+    def count(self, item =True ):
+        setBits = _popcount(self.bits)
+        return setBits if item else self.width * self.height - setBits
+
+    def asList(self, key = True):
+        bits = self.bits if key else ~self.bits & self._mask
+        height = self.height
+        list = []
+        while bits:
+            lowest = bits & -bits
+            list.append(divmod(lowest.bit_length() - 1, height))
+            bits ^= lowest
+        return list
+
+    def _cellDigits(self):
+        size = self.width * self.height
+        return format(self.bits, '0%db' % size)[::-1] if size else ''
+
+    def _setCellDigits(self, digits):
+        self.bits = int(digits[::-1], 2) if digits else 0
+        self._hash = None
+
+    def asBitGrid(self):
+        return self
+
+class _BitGridColumn:
+    "The column grid[x] of a BitGrid, so that grid[x][y] reads and writes bits."
+    __slots__ = ('grid', 'x')
+
+    def __init__(self, grid, x):
+        self.grid = grid
+        self.x = x
+
+    def __getitem__(self, y):
+        grid = self.grid
+        if y < 0: y += grid.height
+        if not 0 <= y < grid.height: raise IndexError('BitGrid index out of range')
+        return (grid.bits >> (self.x * grid.height + y)) & 1 == 1
+
+    def __setitem__(self, y, value):
+        if y < 0: y += self.grid.height
+        if not 0 <= y < self.grid.height: raise IndexError('BitGrid index out of range')
+        self.grid.set(self.x, y, value)
+
+    def __len__(self):
+        return self.grid.height
 
 def reconstituteGrid(bitRep):
     if type(bitRep) is not type((1,2)):
@@ -280,6 +418,29 @@ def reconstituteGrid(bitRep):
     width, height = bitRep[:2]
     return Grid(width, height, bitRepresentation= bitRep[2:])
 
+GRID_HEADER = struct.Struct('<HH')
+
+def gridBytesSize(width, height):
+    "The length of Grid.toBytes for a width x height grid."
+    return GRID_HEADER.size + (width * height + 7) // 8
+
+def gridFromBytes(buffer, offset=0, gridClass=None):
+    """
+    Reads a grid written by Grid.toBytes at offset of buffer (bytes, a
+    bytearray, a memoryview or an mmap) and returns it with the offset of the
+    end of its bytes.  The grid is a BitGrid unless gridClass says otherwise.
+    """
+    width, height = GRID_HEADER.unpack_from(buffer, offset)
+    start = offset + GRID_HEADER.size
+    end = offset + gridBytesSize(width, height)
+    bits = int.from_bytes(memoryview(buffer)[start:end], 'little')
+    grid = BitGrid(width, height, bits=bits)
+    if gridClass is not None and gridClass is not BitGrid:
+        plain = gridClass(width, height)
+        plain._setCellDigits(grid._cellDigits())
+        grid = plain
+    return grid, end
+
 ####################################
 # Parts you shouldn't have to read #
 ####################################
@@ -329,7 +490,28 @@ class Actions:
         return (dx * speed, dy * speed)
     directionToVector = staticmethod(directionToVector)
 
+    def getLegalMoveTable(walls):
+        """
+        Returns the LegalMoveTable of walls, kept on the walls grid once found.
+        Tables are shared by all the walls grids holding the same cells, so
+        that the copies of a layout made for every observation do not build
+        their own.  The walls must not change afterwards.
+        """
+        table = walls.__dict__.get('_legalMoveTable')
+        if table is None:
+            key = (walls.width, walls.height, walls.asBitGrid().bits)
+            table = LEGAL_MOVE_TABLES.get(key)
+            if table is None:
+                table = LEGAL_MOVE_TABLES[key] = LegalMoveTable(walls)
+            walls._legalMoveTable = table
+        return table
+    getLegalMoveTable = staticmethod(getLegalMoveTable)
+
     def getPossibleActions(config, walls):
+        actions = Actions.getLegalMoveTable(walls).actions.get(config.pos)
+        if actions is not None:
+            return list(actions)
+
         possible = []
         x, y = config.pos
         x_int, y_int = int(x + 0.5), int(y + 0.5)
@@ -338,28 +520,14 @@ class Actions:
         if (abs(x - x_int) + abs(y - y_int)  > Actions.TOLERANCE):
             return [config.getDirection()]
 
-        for dir, vec in Actions._directionsAsList:
-            dx, dy = vec
-            next_y = y_int + dy
-            next_x = x_int + dx
-            if not walls[next_x][next_y]: possible.append(dir)
-
-        return possible
+        return list(Actions.getLegalMoveTable(walls).actions[(x_int, y_int)])
 
     getPossibleActions = staticmethod(getPossibleActions)
 
     def getLegalNeighbors(position, walls):
         x,y = position
         x_int, y_int = int(x + 0.5), int(y + 0.5)
-        neighbors = []
-        for dir, vec in Actions._directionsAsList:
-            dx, dy = vec
-            next_x = x_int + dx
-            if next_x < 0 or next_x == walls.width: continue
-            next_y = y_int + dy
-            if next_y < 0 or next_y == walls.height: continue
-            if not walls[next_x][next_y]: neighbors.append((next_x, next_y))
-        return neighbors
+        return list(Actions.getLegalMoveTable(walls).neighbors[(x_int, y_int)])
     getLegalNeighbors = staticmethod(getLegalNeighbors)
 
     def getSuccessor(position, action):
@@ -368,18 +536,78 @@ class Actions:
         return (x + dx, y + dy)
     getSuccessor = staticmethod(getSuccessor)
 
+# The LegalMoveTable of each walls layout, by (width, height, BitGrid bits)
+LEGAL_MOVE_TABLES = {}
+
+class LegalMoveTable:
+    """
+    The legal actions and neighbours of every cell of a walls grid, in the
+    order of Actions._directions.  Cells outside the grid count as walls.
+
+    actions[(x,y)]: the directions (STOP included) an agent at (x,y) can take
+    neighbors[(x,y)]: the cells reached by them, (x,y) itself included
+    moves[(x,y)]: the (direction, cell) pairs of the moves other than STOP
+    """
+    def __init__(self, walls):
+        self.actions = {}
+        self.neighbors = {}
+        self.moves = {}
+        width, height = walls.width, walls.height
+        for x in range(width):
+            for y in range(height):
+                actions, neighbors, moves = [], [], []
+                for direction, (dx, dy) in Actions._directionsAsList:
+                    nextx, nexty = x + dx, y + dy
+                    if not (0 <= nextx < width and 0 <= nexty < height) or walls[nextx][nexty]:
+                        continue
+                    actions.append(direction)
+                    neighbors.append((nextx, nexty))
+                    if direction != Directions.STOP:
+                        moves.append((direction, (nextx, nexty)))
+                self.actions[(x, y)] = tuple(actions)
+                self.neighbors[(x, y)] = tuple(neighbors)
+                self.moves[(x, y)] = tuple(moves)
+
+# Random 64-bit keys of the state features, drawn on first use.  They are shared
+# by every layout so that keys stay comparable between deep copies of a state.
+ZOBRIST_KEYS = {}
+_ZOBRIST_RANDOM = random.Random(0)
+
+def zobristKey( feature ):
+    """
+    Returns the random key of a feature of a GameStateData: ('food', x, y),
+    ('capsule', x, y) or (agentIndex, position, direction, scaredTimer).
+    """
+    key = ZOBRIST_KEYS.get( feature )
+    if key is None:
+        key = ZOBRIST_KEYS[feature] = _ZOBRIST_RANDOM.getrandbits( 64 )
+    return key
+
 class GameStateData:
     """
 
     """
-    def __init__( self, prevState = None ):
+    def __init__( self, prevState = None, copyOnWrite = False ):
         """
         Generates a new data packet by copying information from its predecessor.
+
+        With copyOnWrite, the food grid, the capsule list and the agent states
+        are shared with the predecessor: whoever changes them must first replace
+        them with copies (see getWritableAgentState).
         """
+        self._sharedAgentStates = set()
+        self._zobrist = None
         if prevState != None:
-            self.food = prevState.food.shallowCopy()
-            self.capsules = prevState.capsules[:]
-            self.agentStates = self.copyAgentStates( prevState.agentStates )
+            self._zobrist = prevState._zobrist
+            if copyOnWrite:
+                self.food = prevState.food
+                self.capsules = prevState.capsules
+                self.agentStates = prevState.agentStates[:]
+                self._sharedAgentStates = set( range( len( self.agentStates ) ) )
+            else:
+                self.food = prevState.food.shallowCopy()
+                self.capsules = prevState.capsules[:]
+                self.agentStates = self.copyAgentStates( prevState.agentStates )
             self.layout = prevState.layout
             self._eaten = prevState._eaten
             self.score = prevState.score
@@ -402,6 +630,114 @@ class GameStateData:
         state._capsuleEaten = self._capsuleEaten
         return state
 
+    def getWritableAgentState( self, agentIndex ):
+        """
+        Returns the AgentState of agentIndex, copying it first if it is still
+        shared with the predecessor.
+        """
+        if agentIndex in self._sharedAgentStates:
+            self._sharedAgentStates.remove( agentIndex )
+            self.agentStates[agentIndex] = self.agentStates[agentIndex].copy()
+        return self.agentStates[agentIndex]
+
+    def agentZobristKey( self, agentIndex ):
+        configuration = self.agentStates[agentIndex].configuration
+        return zobristKey( (agentIndex, configuration.pos, configuration.direction,
+                            self.agentStates[agentIndex].scaredTimer) )
+
+    def xorAgentKey( self, agentIndex ):
+        """
+        Removes the current state of agentIndex from the Zobrist key, or adds
+        it back.  The rules call it before and after changing an agent state.
+        """
+        if self._zobrist is not None:
+            self._zobrist ^= self.agentZobristKey( agentIndex )
+
+    def xorFoodKey( self, position ):
+        "Removes food at position from the Zobrist key, or adds it back."
+        if self._zobrist is not None:
+            self._zobrist ^= zobristKey( ('food',) + tuple( position ) )
+
+    def xorCapsuleKey( self, position ):
+        "Removes a capsule at position from the Zobrist key, or adds it back."
+        if self._zobrist is not None:
+            self._zobrist ^= zobristKey( ('capsule',) + tuple( position ) )
+
+    def getZobristKey( self ):
+        """
+        Returns the Zobrist key of the food, capsules and agent states: the xor
+        of the keys of their features.  It is computed once from scratch and
+        then kept up to date by the rules in O(1) per move.
+        """
+        if self._zobrist is None:
+            key = 0
+            for x, y in self.food.asList():
+                key ^= zobristKey( ('food', x, y) )
+            for x, y in self.capsules:
+                key ^= zobristKey( ('capsule', x, y) )
+            for agentIndex in range( len( self.agentStates ) ):
+                key ^= self.agentZobristKey( agentIndex )
+            self._zobrist = key
+        return self._zobrist
+
+    # Score, score change, win and lose flags, number of agents and of capsules
+    _BYTES_HEADER = struct.Struct( '<ddBBH' )
+    # Start position and direction, position and direction, isPacman, eaten,
+    # scared timer, food carried and food returned
+    _BYTES_AGENT = struct.Struct( '<ddBddBBBHHH' )
+    _BYTES_CAPSULE = struct.Struct( '<HH' )
+
+    def toBytes( self ):
+        """
+        Returns the state, without its layout, as bytes: a header, the agent
+        states and the capsules as fixed size structs, then the food grid
+        (see Grid.toBytes).  GameStateData.fromBytes reads it back.
+        """
+        out = bytearray( self._BYTES_HEADER.pack( self.score, self.scoreChange, self._win | self._lose << 1,
+                                                  len( self.agentStates ), len( self.capsules ) ) )
+        index = Directions.INDEX
+        for agentState, eaten in zip( self.agentStates, self._eaten ):
+            start, configuration = agentState.start, agentState.configuration
+            out += self._BYTES_AGENT.pack( start.pos[0], start.pos[1], index[start.direction],
+                                           configuration.pos[0], configuration.pos[1], index[configuration.direction],
+                                           agentState.isPacman, eaten, agentState.scaredTimer,
+                                           agentState.numCarrying, agentState.numReturned )
+        for capsule in self.capsules:
+            out += self._BYTES_CAPSULE.pack( *capsule )
+        out += self.food.toBytes()
+        return bytes( out )
+
+    def fromBytes( buffer, layout ):
+        """
+        Rebuilds a state written by toBytes on layout.  The buffer may be any
+        bytes-like object, such as a memoryview of a memory-mapped file.
+        """
+        buffer = memoryview( buffer )
+        score, scoreChange, flags, numAgents, numCapsules = GameStateData._BYTES_HEADER.unpack_from( buffer )
+        offset = GameStateData._BYTES_HEADER.size
+        state = GameStateData()
+        state.layout = layout
+        state.score, state.scoreChange = score, scoreChange
+        state._win, state._lose = bool( flags & 1 ), bool( flags & 2 )
+        state.agentStates, state._eaten = [], []
+        directions = Directions.AS_LIST
+        for _ in range( numAgents ):
+            ( startX, startY, startDirection, x, y, direction, isPacman, eaten,
+              scaredTimer, numCarrying, numReturned ) = GameStateData._BYTES_AGENT.unpack_from( buffer, offset )
+            offset += GameStateData._BYTES_AGENT.size
+            agentState = AgentState( Configuration( (startX, startY), directions[startDirection] ), bool( isPacman ) )
+            agentState.configuration = Configuration( (x, y), directions[direction] )
+            agentState.scaredTimer, agentState.numCarrying, agentState.numReturned = scaredTimer, numCarrying, numReturned
+            state.agentStates.append( agentState )
+            state._eaten.append( bool( eaten ) )
+        state.capsules = []
+        for _ in range( numCapsules ):
+            state.capsules.append( GameStateData._BYTES_CAPSULE.unpack_from( buffer, offset ) )
+            offset += GameStateData._BYTES_CAPSULE.size
+        state.food, offset = gridFromBytes( buffer, offset, type( layout.food ) )
+        return state
+    fromBytes = staticmethod( fromBytes )
+
     def copyAgentStates( self, agentStates ):
         copiedStates = []
         for agentState in agentStates:
@@ -414,8 +750,9 @@ class GameStateData:
         """
         if other == None: return False
         # TODO Check for type of other
+        if not self.getZobristKey() == other.getZobristKey(): return False
         if not self.agentStates == other.agentStates: return False
-        if not self.food == other.food: return False
+        if not (self.food is other.food or self.food == other.food): return False
         if not self.capsules == other.capsules: return False
         if not self.score == other.score: return False
         return True
@@ -424,13 +761,7 @@ class GameStateData:
         """
         Allows states to be keys of dictionaries.
         """
-        for i, state in enumerate( self.agentStates ):
-            try:
-                int(hash(state))
-            except TypeError as e:
-                print(e)
-                #hash(state)
-        return int((hash(tuple(self.agentStates)) + 13*hash(self.food) + 113* hash(tuple(self.capsules)) + 7 * hash(self.score)) % 1048575 )
+        return hash( (self.getZobristKey(), self.score) )
 
     def __str__( self ):
         width, height = self.layout.width, self.layout.height
@@ -503,6 +834,8 @@ class GameStateData:
                 else: numGhosts += 1
             self.agentStates.append( AgentState( Configuration( pos, Directions.STOP), isPacman) )
         self._eaten = [False for a in self.agentStates]
+        self._zobrist = None
+        self.getZobristKey()
 
 try:
     import boinc
@@ -524,7 +857,9 @@ class Game:
         self.gameOver = False
         self.muteAgents = muteAgents
         self.catchExceptions = catchExceptions
-        self.moveHistory = []
+        self.moveHistory = [] # Not kept when the moves are written to a recorder
+        self.recorder = None # A gameRecords.GameRecorder writing the moves as they are played
+        self.numActions = 0 # Moves played by all the agents
         self.totalAgentTimes = [0 for agent in agents]
         self.totalAgentTimeWarnings = [0 for agent in agents]
         self.agentTimeout = False
@@ -604,7 +939,9 @@ class Game:
                         self.unmute()
                         return
                 else:
+                    start_time = time.time()
                     agent.registerInitialState(self.state.deepCopy())
+                    self.totalAgentTimes[i] += time.time() - start_time
                 ## TODO: could this exceed the total time
                 self.unmute()
 
@@ -683,11 +1020,15 @@ class Game:
                     self.unmute()
                     return
             else:
+                start_time = time.time()
                 action = agent.getAction(observation)
+                self.totalAgentTimes[agentIndex] += time.time() - start_time
             self.unmute()
 
             # Execute the action
-            self.moveHistory.append( (agentIndex, action) )
+            self.numActions += 1
+            if self.recorder is not None: self.recorder.recordMove( agentIndex, action )
+            else: self.moveHistory.append( (agentIndex, action) )
             if self.catchExceptions:
                 try:
                     self.state = self.state.generateSuccessor( agentIndex, action )
@@ -698,6 +1039,7 @@ class Game:
                     return
             else:
                 self.state = self.state.generateSuccessor( agentIndex, action )
+            if self.recorder is not None: self.recorder.recordState( self.state.data )
 
             # Change the display
             self.display.update( self.state.data )
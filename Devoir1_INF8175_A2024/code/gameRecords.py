@@ -0,0 +1,242 @@
+# gameRecords.py
+# --------------
+"""
+Binary records of played games, written by pacman.py --recordActions and read
+back by --replay.
+
+A record is a fixed header, the text of the layout, then one move per two
+bytes (agent index, direction number in Directions.AS_LIST).  It is written
+as the game is played by a GameRecorder, one move at a time, so that a game
+that crashes still leaves a record of its moves up to the crash.  Move i is
+at a known offset, and a record is read by memory-mapping the file and
+decoding moves as they are replayed.
+
+Next to a record, an index file holds a snapshot of the game state every
+KEYFRAME_INTERVAL moves (see GameStateData.toBytes), so that GameRecord.stateAt
+reaches move N by replaying at most KEYFRAME_INTERVAL moves.
+
+Records of the first binary version, which did not store the number of
+ghosts, are replayed with all the ghosts of their layout.  Records written
+with pickle by older versions are still read by loadRecordedGame.
+"""
+
+import bisect
+import mmap
+import os
+import pickle
+import struct
+import time
+
+from game import Directions, GameStateData
+import layout
+
+MAGIC = b'PACREC\x02\n'
+# Magic, length of the layout text in bytes, number of ghosts, number of moves
+HEADER = struct.Struct('<8sIII')
+NUM_MOVES = struct.Struct('<I')
+NUM_MOVES_OFFSET = HEADER.size - NUM_MOVES.size
+# The number of moves of a record still being written, or cut short by a crash
+UNKNOWN_MOVES = 0xFFFFFFFF
+MOVE_SIZE = 2
+
+# The first binary version: magic, length of the layout text, number of moves
+MAGIC_V1 = b'PACREC\x01\n'
+HEADER_V1 = struct.Struct('<8sII')
+# The start of the magic of every binary version
+RECORD_PREFIX = b'PACREC'
+
+INDEX_MAGIC = b'PACIDX\x01\n'
+# Number of moves played before the state, size of the state in bytes
+KEYFRAME = struct.Struct('<II')
+KEYFRAME_INTERVAL = 100
+
+def recordFileName(gameNumber):
+    return ('recorded-game-%d' % gameNumber) +  '-'.join([str(t) for t in time.localtime()[1:6]])
+
+def indexFileName(fileName):
+    return fileName + '.index'
+
+class GameRecorder:
+    """
+    Appends the moves of a game to its record as they are played, and a
+    snapshot of the state to the index every keyframeInterval moves (never if
+    it is 0).  Game.run calls recordMove before each move and recordState
+    after it; close() writes the final number of moves in the header.
+    """
+    def __init__(self, fileName, gameLayout, numGhosts, keyframeInterval=KEYFRAME_INTERVAL):
+        text = '\n'.join(gameLayout.layoutText).encode('utf-8')
+        self.numMoves = 0
+        self.keyframeInterval = keyframeInterval
+        self.file = open(fileName, 'wb')
+        self.file.write(HEADER.pack(MAGIC, len(text), numGhosts, UNKNOWN_MOVES) + text)
+        self.file.flush()
+        self.index = None
+        if keyframeInterval:
+            self.index = open(indexFileName(fileName), 'wb')
+            self.index.write(INDEX_MAGIC)
+            self.index.flush()
+
+    def recordMove(self, agentIndex, action):
+        self.file.write(bytes((agentIndex, Directions.INDEX[action])))
+        self.file.flush()
+        self.numMoves += 1
+
+    def recordState(self, stateData):
+        "Called with the state reached by the last recorded move."
+        if self.index is not None and self.numMoves % self.keyframeInterval == 0:
+            data = stateData.toBytes()
+            self.index.write(KEYFRAME.pack(self.numMoves, len(data)) + data)
+            self.index.flush()
+
+    def close(self):
+        if self.file.closed: return
+        self.file.seek(NUM_MOVES_OFFSET)
+        self.file.write(NUM_MOVES.pack(self.numMoves))
+        self.file.close()
+        if self.index is not None: self.index.close()
+
+class RecordedActions:
+    """
+    The moves of a record as a read-only sequence of (agentIndex, action),
+    decoded from the packed bytes on access.
+    """
+    def __init__(self, packed):
+        self.packed = memoryview(packed)
+
+    def __len__(self):
+        return len(self.packed) // MOVE_SIZE
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step == 1: return RecordedActions(self.packed[start * MOVE_SIZE:max(start, stop) * MOVE_SIZE])
+            return [self[j] for j in range(start, stop, step)]
+        if i < 0: i += len(self)
+        if not 0 <= i < len(self): raise IndexError('move index out of range')
+        offset = i * MOVE_SIZE
+        return self.packed[offset], Directions.AS_LIST[self.packed[offset + 1]]
+
+    def __iter__(self):
+        directions = Directions.AS_LIST
+        packed = self.packed
+        for offset in range(0, len(packed) - MOVE_SIZE + 1, MOVE_SIZE):
+            yield packed[offset], directions[packed[offset + 1]]
+
+class GameRecord:
+    """
+    A record read from a bytes-like object (usually a memory-mapped file),
+    with the keyframes of its index if there is one.  The moves are a view of
+    the buffer, not a copy.
+    """
+    def __init__(self, buffer, indexBuffer=None):
+        buffer = memoryview(buffer)
+        magic = bytes(buffer[:len(MAGIC)])
+        if magic == MAGIC:
+            _, textSize, self.numGhosts, numMoves = HEADER.unpack_from(buffer)
+            start = HEADER.size
+        elif magic == MAGIC_V1:
+            _, textSize, numMoves = HEADER_V1.unpack_from(buffer)
+            self.numGhosts = None
+            start = HEADER_V1.size
+        elif magic.startswith(RECORD_PREFIX):
+            raise ValueError('unsupported record version %r' % magic)
+        else:
+            raise ValueError('not a game record')
+        text = bytes(buffer[start:start + textSize]).decode('utf-8')
+        self.layout = layout.Layout(text.split('\n'))
+        if self.numGhosts is None: self.numGhosts = self.layout.getNumGhosts()
+        start += textSize
+        if numMoves == UNKNOWN_MOVES:
+            numMoves = (len(buffer) - start) // MOVE_SIZE
+        moves = buffer[start:start + numMoves * MOVE_SIZE]
+        if len(moves) != numMoves * MOVE_SIZE: raise ValueError('truncated game record')
+        self.actions = RecordedActions(moves)
+        self.keyframes = readKeyframes(indexBuffer) if indexBuffer is not None else []
+        self.keyframeMoves = [moveNumber for moveNumber, _ in self.keyframes]
+
+    def __len__(self):
+        return len(self.actions)
+
+    def stateAt(self, moveNumber):
+        """
+        Returns the GameState after moveNumber moves, replayed from the last
+        keyframe before it.
+        """
+        if not 0 <= moveNumber <= len(self): raise IndexError('move number out of range')
+        i = bisect.bisect_right(self.keyframeMoves, moveNumber)
+        if i == 0:
+            return replayState(self.layout, self.numGhosts, self.actions[:moveNumber])
+        keyframeMove, data = self.keyframes[i - 1]
+        import pacman
+        state = pacman.GameState()
+        state.data = GameStateData.fromBytes(data, self.layout)
+        return replayState(self.layout, self.numGhosts, self.actions[keyframeMove:moveNumber], state)
+
+    def replayArgs(self, start=0):
+        "The keyword arguments of pacman.replayGame to replay from move start."
+        return {'layout': self.layout, 'actions': self.actions[start:], 'numGhosts': self.numGhosts,
+                'state': self.stateAt(start) if start else None}
+
+def readKeyframes(buffer):
+    """
+    Returns the (moveNumber, state bytes) of an index, dropping a last
+    keyframe cut short by a crash.
+    """
+    buffer = memoryview(buffer)
+    if bytes(buffer[:len(INDEX_MAGIC)]) != INDEX_MAGIC: raise ValueError('not a game record index')
+    keyframes = []
+    offset = len(INDEX_MAGIC)
+    while offset + KEYFRAME.size <= len(buffer):
+        moveNumber, size = KEYFRAME.unpack_from(buffer, offset)
+        offset += KEYFRAME.size
+        if offset + size > len(buffer): break
+        keyframes.append((moveNumber, buffer[offset:offset + size]))
+        offset += size
+    return keyframes
+
+def replayState(gameLayout, numGhosts, actions, state=None):
+    "Returns the GameState reached by playing actions from state, or from the start."
+    import pacman
+    if state is None:
+        state = pacman.GameState()
+        state.initialize(gameLayout, numGhosts)
+    for action in actions:
+        state = state.generateSuccessor(*action)
+    return state
+
+def mapFile(fileName):
+    "A read-only memory map of fileName, or its bytes if it is empty."
+    f = open(fileName, 'rb')
+    try:
+        if os.fstat(f.fileno()).st_size == 0: return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    finally: f.close()
+
+def readGameRecord(fileName):
+    "Memory-maps the record in fileName and its index if there is one."
+    indexBuffer = None
+    if os.path.exists(indexFileName(fileName)):
+        indexBuffer = mapFile(indexFileName(fileName))
+    return GameRecord(mapFile(fileName), indexBuffer)
+
+def isGameRecord(fileName):
+    f = open(fileName, 'rb')
+    try: return f.read(len(RECORD_PREFIX)) == RECORD_PREFIX
+    finally: f.close()
+
+def loadRecordedGame(fileName, start=0):
+    """
+    Reads a binary record, or a pickled one from an older version, and
+    returns the keyword arguments of pacman.replayGame to replay it from move
+    start.
+    """
+    if isGameRecord(fileName):
+        return readGameRecord(fileName).replayArgs(start)
+    f = open(fileName, 'rb')
+    try: recorded = pickle.load(f)
+    finally: f.close()
+    if start:
+        gameLayout, actions = recorded['layout'], recorded['actions']
+        recorded['state'] = replayState(gameLayout, gameLayout.getNumGhosts(), actions[:start])
+        recorded['actions'] = actions[start:]
+    return recorded
@@ -0,0 +1,111 @@
+# gridArrays.py
+# -------------
+"""
+NumPy array snapshots of the boolean grids of the game (food, walls,
+capsules), for heuristics and evaluation functions that work on whole boards
+at once.  A Grid (lists of lists) or a BitGrid (one int) has no buffer NumPy
+could view, so each GridArray is one copy of its grid.
+
+NumPy is optional: the rest of the project does not need it, and building a
+GridArray without it raises an ImportError.
+
+>>> food = GridArray(gameState.getFood())
+>>> food.count(), food.manhattanDistances(gameState.getPacmanPosition())
+>>> food.mazeDistances(gameState.getPacmanPosition(), gameState.getWalls())
+"""
+
+from game import BitGrid
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+UNREACHABLE = -1
+
+class GridArray:
+    """
+    A boolean Grid or BitGrid as a width x height NumPy array, where
+    array[x, y] is grid[x][y].  A BitGrid is unpacked straight from the bytes
+    of its int and a Grid from its columns, without building any list of
+    positions.  The array is a snapshot: it does not follow later changes
+    of the grid.
+    """
+    def __init__(self, grid):
+        if numpy is None:
+            raise ImportError('gridArrays needs NumPy (pip install numpy)')
+        self.width, self.height = grid.width, grid.height
+        if isinstance(grid, BitGrid):
+            size = self.width * self.height
+            packed = numpy.frombuffer(grid.bits.to_bytes((size + 7) // 8, 'little'), dtype=numpy.uint8)
+            self.array = numpy.unpackbits(packed, count=size, bitorder='little').view(bool).reshape(self.width, self.height)
+        else:
+            self.array = numpy.array(grid.data, dtype=bool).reshape(self.width, self.height)
+
+    def count(self):
+        return int(numpy.count_nonzero(self.array))
+
+    def positions(self):
+        "The (x, y) of the set cells as an n x 2 array, in the order of Grid.asList."
+        return numpy.argwhere(self.array)
+
+    def asList(self):
+        return [(int(x), int(y)) for x, y in self.positions()]
+
+    def manhattanDistances(self, position):
+        "The Manhattan distances from position to each set cell, in the order of positions()."
+        return numpy.abs(self.positions() - numpy.asarray(position)).sum(axis=1)
+
+    def mazeDistances(self, position, walls):
+        """
+        The maze distances from position to each set cell, in the order of
+        positions(), UNREACHABLE for cells that cannot be reached.
+        """
+        sources = numpy.zeros((self.width, self.height), dtype=bool)
+        sources[int(position[0]), int(position[1])] = True
+        distances = distanceTransform(sources, ~getWallsArray(walls))
+        return distances[self.array]
+
+    def distanceTransform(self, walls=None):
+        """
+        The distance from every cell to its closest set cell: the Manhattan
+        distance, or the maze distance around walls if they are given, with
+        UNREACHABLE on walls and cells that cannot reach any set cell.
+        """
+        if walls is None:
+            return distanceTransform(self.array, numpy.ones((self.width, self.height), dtype=bool))
+        return distanceTransform(self.array, ~getWallsArray(walls))
+
+def getWallsArray(walls):
+    """
+    Returns the array of a walls grid, built on first use and then kept on
+    the grid like Actions.getLegalMoveTable.  The walls must not change.
+    """
+    array = walls.__dict__.get('_array')
+    if array is None:
+        array = walls._array = GridArray(walls).array
+    return array
+
+def distanceTransform(sources, passable):
+    """
+    Breadth first search from every source cell at once over the passable
+    cells, each step growing the frontier by one cell in the four directions
+    with array shifts.  Returns the distance of each cell to its closest
+    source, UNREACHABLE where there is no path.
+    """
+    distances = numpy.full(sources.shape, UNREACHABLE, dtype=numpy.int32)
+    frontier = sources & passable
+    visited = frontier.copy()
+    distances[frontier] = 0
+    distance = 0
+    while frontier.any():
+        distance += 1
+        grown = numpy.zeros_like(frontier)
+        grown[1:, :] |= frontier[:-1, :]
+        grown[:-1, :] |= frontier[1:, :]
+        grown[:, 1:] |= frontier[:, :-1]
+        grown[:, :-1] |= frontier[:, 1:]
+        frontier = grown & passable & ~visited
+        visited |= frontier
+        distances[frontier] = distance
+    return distances
@@ -15,11 +15,19 @@
 from util import manhattanDistance
 from game import Grid
 import os
+import pickle
 import random
-from functools import reduce
 
 VISIBILITY_MATRIX_CACHE = {}
 
+# Layouts already loaded, by absolute path: (file stamp, Layout)
+LAYOUT_REGISTRY = {}
+# The layouts of a layouts/ directory are also kept in layouts.cache next to it
+LAYOUT_CACHE_FILE = 'layouts.cache'
+USE_LAYOUT_CACHE_FILE = True
+# Contents of the cache files read so far, by path
+_LAYOUT_CACHE_FILES = {}
+
 class Layout:
     """
     A Layout manages the static information about the game board.
@@ -36,18 +44,21 @@ class Layout:
         self.processLayoutText(layoutText)
         self.layoutText = layoutText
         self.totalFood = len(self.food.asList())
-        # self.initializeVisibilityMatrix()
+        self.visibility = None # Built by initializeVisibilityMatrix on first use
 
     def getNumGhosts(self):
         return self.numGhosts
 
     def initializeVisibilityMatrix(self):
         global VISIBILITY_MATRIX_CACHE
-        if reduce(str.__add__, self.layoutText) not in VISIBILITY_MATRIX_CACHE:
+        key = ''.join(self.layoutText)
+        if key not in VISIBILITY_MATRIX_CACHE:
             from game import Directions
             vecs = [(-0.5,0), (0.5,0),(0,-0.5),(0,0.5)]
             dirs = [Directions.NORTH, Directions.SOUTH, Directions.WEST, Directions.EAST]
-            vis = Grid(self.width, self.height, {Directions.NORTH:set(), Directions.SOUTH:set(), Directions.EAST:set(), Directions.WEST:set(), Directions.STOP:set()})
+            # A grid of dicts: Grid only holds booleans
+            vis = [[dict((direction, set()) for direction in dirs + [Directions.STOP])
+                    for y in range(self.height)] for x in range(self.width)]
             for x in range(self.width):
                 for y in range(self.height):
                     if self.walls[x][y] == False:
@@ -56,11 +67,11 @@ class Layout:
                             nextx, nexty = x + dx, y + dy
                             while (nextx + nexty) != int(nextx) + int(nexty) or not self.walls[int(nextx)][int(nexty)] :
                                 vis[x][y][direction].add((nextx, nexty))
-                                nextx, nexty = x + dx, y + dy
+                                nextx, nexty = nextx + dx, nexty + dy
             self.visibility = vis
-            VISIBILITY_MATRIX_CACHE[reduce(str.__add__, self.layoutText)] = vis
+            VISIBILITY_MATRIX_CACHE[key] = vis
         else:
-            self.visibility = VISIBILITY_MATRIX_CACHE[reduce(str.__add__, self.layoutText)]
+            self.visibility = VISIBILITY_MATRIX_CACHE[key]
 
     def isWall(self, pos):
         x, col = pos
@@ -84,6 +95,7 @@ class Layout:
         return pos
 
     def isVisibleFrom(self, ghostPos, pacPos, pacDirection):
+        if self.visibility is None: self.initializeVisibilityMatrix()
         row, col = [int(x) for x in pacPos]
         return ghostPos in self.visibility[row][col][pacDirection]
 
@@ -91,7 +103,19 @@ class Layout:
         return "\n".join(self.layoutText)
 
     def deepCopy(self):
-        return Layout(self.layoutText[:])
+        """
+        Copies the layout without parsing its text again.  The walls never
+        change, so the copy shares them, and with them the tables cached on
+        them (Actions.getLegalMoveTable, gridArrays.getWallsArray).  The game
+        deep-copies the layout for every agent observation.
+        """
+        layout = Layout.__new__(Layout)
+        layout.__dict__.update(self.__dict__)
+        layout.layoutText = self.layoutText[:]
+        layout.food = self.food.copy()
+        layout.capsules = self.capsules[:]
+        layout.agentPositions = self.agentPositions[:]
+        return layout
 
     def processLayoutText(self, layoutText):
         """
@@ -129,22 +153,119 @@ class Layout:
         elif layoutChar in  ['1', '2', '3', '4']:
             self.agentPositions.append( (int(layoutChar), (x,y)))
             self.numGhosts += 1
+
+    def toRecord(self):
+        "Returns the compact, picklable form of the layout read by fromRecord."
+        return (self.layoutText, self.walls.data, self.food.data, self.capsules,
+                self.agentPositions, self.numGhosts, self.totalFood)
+
+    def fromRecord(record):
+        "Rebuilds a Layout from toRecord without parsing its text again."
+        layout = Layout.__new__(Layout)
+        layoutText, walls, food, capsules, agentPositions, numGhosts, totalFood = record
+        layout.layoutText = layoutText
+        layout.width, layout.height = len(walls), len(walls[0])
+        layout.walls = Grid(layout.width, layout.height)
+        layout.walls.data = walls
+        layout.food = Grid(layout.width, layout.height)
+        layout.food.data = food
+        layout.capsules = list(capsules)
+        layout.agentPositions = list(agentPositions)
+        layout.numGhosts = numGhosts
+        layout.totalFood = totalFood
+        layout.visibility = None
+        return layout
+    fromRecord = staticmethod(fromRecord)
+
 def getLayout(name, back = 2):
-    if name.endswith('.lay'):
-        layout = tryToLoad('layouts/' + name)
-        if layout == None: layout = tryToLoad(name)
-    else:
-        layout = tryToLoad('layouts/' + name + '.lay')
-        if layout == None: layout = tryToLoad(name + '.lay')
-    if layout == None and back >= 0:
-        curdir = os.path.abspath('.')
-        os.chdir('..')
-        layout = getLayout(name, back -1)
-        os.chdir(curdir)
-    return layout
+    """
+    Returns the Layout called name, or None if it cannot be found.  It is
+    looked up in layouts/ and then in the current directory, then likewise in
+    up to back + 1 parent directories.
+
+    Each layout file is parsed once: the Layout returned is shared between
+    the calls and must not be modified.
+    """
+    path = findLayout(name, back)
+    if path == None: return None
+    return loadLayout(path)
+
+def findLayout(name, back = 2):
+    "Returns the path of the layout file called name, or None."
+    fileName = name if name.endswith('.lay') else name + '.lay'
+    directory = os.path.abspath('.')
+    for level in range(back + 2):
+        for path in (os.path.join(directory, 'layouts', fileName), os.path.join(directory, fileName)):
+            if os.path.exists(path): return path
+        directory = os.path.dirname(directory)
+    return None
 
 def tryToLoad(fullname):
     if(not os.path.exists(fullname)): return None
-    f = open(fullname)
-    try: return Layout([line.strip() for line in f])
-    finally: f.close()
+    return loadLayout(fullname)
+
+def loadLayout(path):
+    """
+    Returns the Layout of a layout file, from the registry of loaded layouts,
+    then from the cache file of its layouts/ directory, and parses it only if
+    both miss or are older than the file.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    entry = LAYOUT_REGISTRY.get(path)
+    if entry == None or entry[0] != stamp:
+        layout = readCachedLayout(path, stamp)
+        if layout == None:
+            f = open(path)
+            try: layout = Layout([line.strip() for line in f])
+            finally: f.close()
+            writeCachedLayout(path, stamp, layout)
+        entry = LAYOUT_REGISTRY[path] = (stamp, layout)
+    return entry[1]
+
+def layoutCachePath(path):
+    "Returns the cache file of a layout file, or None if it is not in a layouts/ directory."
+    directory = os.path.dirname(path)
+    if not USE_LAYOUT_CACHE_FILE or os.path.basename(directory) != 'layouts': return None
+    return os.path.join(os.path.dirname(directory), LAYOUT_CACHE_FILE)
+
+def readLayoutCache(cachePath):
+    "Returns the records of a cache file, {file name: (stamp, record)}."
+    if cachePath not in _LAYOUT_CACHE_FILES:
+        records = {}
+        try:
+            f = open(cachePath, 'rb')
+            try: records = pickle.load(f)
+            finally: f.close()
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+        _LAYOUT_CACHE_FILES[cachePath] = records
+    return _LAYOUT_CACHE_FILES[cachePath]
+
+def readCachedLayout(path, stamp):
+    cachePath = layoutCachePath(path)
+    if cachePath == None: return None
+    cached = readLayoutCache(cachePath).get(os.path.basename(path))
+    if cached == None or cached[0] != stamp: return None
+    try: return Layout.fromRecord(cached[1])
+    except (TypeError, ValueError): return None # Written by another version
+
+def writeCachedLayout(path, stamp, layout):
+    """
+    Adds a layout to the cache file of its directory.  The file is replaced
+    atomically, so that parallel runs never read a partial cache; failing to
+    write it only costs the parse next time.
+    """
+    cachePath = layoutCachePath(path)
+    if cachePath == None: return
+    records = readLayoutCache(cachePath)
+    records[os.path.basename(path)] = (stamp, layout.toRecord())
+    tmpPath = '%s.%d.tmp' % (cachePath, os.getpid())
+    try:
+        f = open(tmpPath, 'wb')
+        try: pickle.dump(records, f, pickle.HIGHEST_PROTOCOL)
+        finally: f.close()
+        os.replace(tmpPath, cachePath)
+    except OSError:
+        if os.path.exists(tmpPath): os.remove(tmpPath)
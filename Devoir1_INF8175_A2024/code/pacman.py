@@ -43,6 +43,7 @@ from game import GameStateData
 from game import Game
 from game import Directions
 from game import Actions
+from game import Configuration
 from util import nearestPoint
 from util import manhattanDistance
 import util, layout
@@ -73,6 +74,10 @@ class GameState:
 
     # static variable keeps track of which states have had getLegalActions called
     explored = set()
+    # generateSuccessor adds to explored only while trackExplored is set
+    trackExplored = True
+    # successors share the food, capsules and agent states they leave unchanged
+    copyOnWrite = True
     def getAndResetExplored():
         tmp = GameState.explored.copy()
         GameState.explored = set()
@@ -112,7 +117,9 @@ class GameState:
         if agentIndex == 0:
             state.data.scoreChange += -TIME_PENALTY # Penalty for waiting around
         else:
-            GhostRules.decrementTimer( state.data.agentStates[agentIndex] )
+            state.data.xorAgentKey( agentIndex )
+            GhostRules.decrementTimer( state.data.getWritableAgentState( agentIndex ) )
+            state.data.xorAgentKey( agentIndex )
 
         # Resolve multi-agent effects
         GhostRules.checkDeath( state, agentIndex )
@@ -120,8 +127,9 @@ class GameState:
         # Book keeping
         state.data._agentMoved = agentIndex
         state.data.score += state.data.scoreChange
-        GameState.explored.add(self)
-        GameState.explored.add(state)
+        if GameState.trackExplored:
+            GameState.explored.add(self)
+            GameState.explored.add(state)
         return state
 
     def getLegalPacmanActions( self ):
@@ -222,12 +230,12 @@ class GameState:
         Generates a new state by copying information from its predecessor.
         """
         if prevState != None: # Initial state
-            self.data = GameStateData(prevState.data)
+            self.data = GameStateData(prevState.data, GameState.copyOnWrite)
         else:
             self.data = GameStateData()
 
     def deepCopy( self ):
-        state = GameState( self )
+        state = GameState()
         state.data = self.data.deepCopy()
         return state
 
@@ -243,6 +251,13 @@ class GameState:
         """
         return hash( self.data )
 
+    def getZobristKey( self ):
+        """
+        Returns a 64-bit key of the food, capsules and agent states, updated in
+        O(1) by each move.  Equal states have equal keys.
+        """
+        return self.data.getZobristKey()
+
     def __str__( self ):
 
         return str(self.data)
@@ -342,11 +357,13 @@ class PacmanRules:
         if action not in legal:
             raise Exception("Illegal action " + str(action))
 
-        pacmanState = state.data.agentStates[0]
+        pacmanState = state.data.getWritableAgentState( 0 )
 
         # Update Configuration
         vector = Actions.directionToVector( action, PacmanRules.PACMAN_SPEED )
+        state.data.xorAgentKey( 0 )
         pacmanState.configuration = pacmanState.configuration.generateSuccessor( vector )
+        state.data.xorAgentKey( 0 )
 
         # Eat
         next = pacmanState.configuration.getPosition()
@@ -363,6 +380,7 @@ class PacmanRules:
             state.data.scoreChange += 10
             state.data.food = state.data.food.copy()
             state.data.food[x][y] = False
+            state.data.xorFoodKey( position )
             state.data._foodEaten = position
             # TODO: cache numFood?
             numFood = state.getNumFood()
@@ -371,11 +389,14 @@ class PacmanRules:
                 state.data._win = True
         # Eat capsule
         if( position in state.getCapsules() ):
-            state.data.capsules.remove( position )
+            state.data.capsules = [capsule for capsule in state.data.capsules if capsule != position]
+            state.data.xorCapsuleKey( position )
             state.data._capsuleEaten = position
             # Reset all ghosts' scared timers
             for index in range( 1, len( state.data.agentStates ) ):
-                state.data.agentStates[index].scaredTimer = SCARED_TIME
+                state.data.xorAgentKey( index )
+                state.data.getWritableAgentState( index ).scaredTimer = SCARED_TIME
+                state.data.xorAgentKey( index )
     consume = staticmethod( consume )
 
 class GhostRules:
@@ -404,17 +425,20 @@ class GhostRules:
         if action not in legal:
             raise Exception("Illegal ghost action " + str(action))
 
-        ghostState = state.data.agentStates[ghostIndex]
+        ghostState = state.data.getWritableAgentState( ghostIndex )
         speed = GhostRules.GHOST_SPEED
         if ghostState.scaredTimer > 0: speed /= 2.0
         vector = Actions.directionToVector( action, speed )
+        state.data.xorAgentKey( ghostIndex )
         ghostState.configuration = ghostState.configuration.generateSuccessor( vector )
+        state.data.xorAgentKey( ghostIndex )
     applyAction = staticmethod( applyAction )
 
     def decrementTimer( ghostState):
         timer = ghostState.scaredTimer
         if timer == 1:
-            ghostState.configuration.pos = nearestPoint( ghostState.configuration.pos )
+            configuration = ghostState.configuration
+            ghostState.configuration = Configuration( nearestPoint( configuration.pos ), configuration.direction )
         ghostState.scaredTimer = max( 0, timer - 1 )
     decrementTimer = staticmethod( decrementTimer )
 
@@ -435,10 +459,14 @@ class GhostRules:
 
     def collide( state, ghostState, agentIndex):
         if ghostState.scaredTimer > 0:
+            ghostState = state.data.getWritableAgentState( agentIndex )
             state.data.scoreChange += 200
+            state.data.xorAgentKey( agentIndex )
             GhostRules.placeGhost(state, ghostState)
             ghostState.scaredTimer = 0
+            state.data.xorAgentKey( agentIndex )
             # Added for first-person
+            state.data._eaten = state.data._eaten[:]
             state.data._eaten[agentIndex] = True
         else:
             if not state.data._win:
@@ -512,7 +540,9 @@ def readCommand( argv ):
     parser.add_option('-r', '--recordActions', action='store_true', dest='record',
                       help='Writes game histories to a file (named by the time they were played)', default=False)
     parser.add_option('--replay', dest='gameToReplay',
-                      help='A recorded game file (pickle) to replay', default=None)
+                      help='A recorded game file to replay', default=None)
+    parser.add_option('--replayFrom', dest='replayFrom', type='int',
+                      help=default('Move of the recorded game to start the replay from'), default=0)
     parser.add_option('-a','--agentArgs',dest='agentArgs',
                       help='Comma separated values sent to agent. e.g. "opt1=val1,opt2,opt3=val3"')
     parser.add_option('-x', '--numTraining', dest='numTraining', type='int',
@@ -523,6 +553,10 @@ def readCommand( argv ):
                       help='Turns on exception handling and timeouts during games', default=False)
     parser.add_option('--timeout', dest='timeout', type='int',
                       help=default('Maximum length of time an agent can spend computing in a single game'), default=30)
+    parser.add_option('-j', '--jobs', dest='jobs', type='int',
+                      help=default('Number of worker processes; more than 1 plays the games in a headless batch'), default=1)
+    parser.add_option('--seed', dest='seed', type='int',
+                      help=default('Random seed of the first game of a batch, game i using seed + i'), default=0)
 
     options, otherjunk = parser.parse_args(argv)
     if len(otherjunk) != 0:
@@ -537,12 +571,22 @@ def readCommand( argv ):
     if args['layout'] == None: raise Exception("The layout " + options.layout + " cannot be found")
 
     # Choose a Pacman agent
-    noKeyboard = options.gameToReplay == None and (options.textGraphics or options.quietGraphics)
+    noKeyboard = options.gameToReplay == None and (options.textGraphics or options.quietGraphics or options.jobs > 1)
     pacmanType = loadAgent(options.pacman, noKeyboard)
     agentOpts = parseAgentArgs(options.agentArgs)
     if options.numTraining > 0:
         args['numTraining'] = options.numTraining
         if 'numTraining' not in agentOpts: agentOpts['numTraining'] = options.numTraining
+
+    # Special case: batches build their agents in the worker processes
+    if options.jobs > 1 and options.gameToReplay == None:
+        ghostType = loadAgent(options.ghost, noKeyboard)
+        args.update({'pacmanType': pacmanType, 'agentOpts': agentOpts, 'ghostType': ghostType,
+                     'numGhosts': options.numGhosts, 'numGames': options.numGames, 'jobs': options.jobs,
+                     'seed': options.seed, 'record': options.record,
+                     'catchExceptions': options.catchExceptions, 'timeout': options.timeout})
+        return args
+
     pacman = pacmanType(**agentOpts) # Instantiate Pacman with agentArgs
     args['pacman'] = pacman
 
@@ -574,10 +618,8 @@ def readCommand( argv ):
     # Special case: recorded games don't use the runGames method or args structure
     if options.gameToReplay != None:
         print('Replaying recorded game %s.' % options.gameToReplay)
-        import pickle
-        f = open(options.gameToReplay, 'rb')
-        try: recorded = pickle.load(f)
-        finally: f.close()
+        import gameRecords
+        recorded = gameRecords.loadRecordedGame(options.gameToReplay, options.replayFrom)
         recorded['display'] = args['display']
         replayGame(**recorded)
         sys.exit(0)
@@ -607,11 +649,17 @@ def loadAgent(pacman, nographics):
                 return getattr(module, pacman)
     raise Exception('The agent ' + pacman + ' is not specified in any *Agents.py.')
 
-def replayGame( layout, actions, display ):
+def replayGame( layout, actions, display, numGhosts=None, state=None ):
+    """
+    Replays actions on layout with numGhosts ghosts (all those of the layout
+    by default), starting from state if it is given.
+    """
     import pacmanAgents, ghostAgents
+    if numGhosts is None: numGhosts = layout.getNumGhosts()
     rules = ClassicGameRules()
-    agents = [pacmanAgents.GreedyAgent()] + [ghostAgents.RandomGhost(i+1) for i in range(layout.getNumGhosts())]
+    agents = [pacmanAgents.GreedyAgent()] + [ghostAgents.RandomGhost(i+1) for i in range(numGhosts)]
     game = rules.newGame( layout, agents[0], agents[1:], display )
+    if state is not None: game.state = state
     state = game.state
     display.initialize(state.data)
 
@@ -630,7 +678,7 @@ def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0
     __main__.__dict__['_display'] = display
 
     rules = ClassicGameRules(timeout)
-    games = []
+    results = []
 
     for i in range( numGames ):
         beQuiet = i < numTraining
@@ -643,27 +691,95 @@ def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0
             gameDisplay = display
             rules.quiet = False
         game = rules.newGame( layout, pacman, ghosts, gameDisplay, beQuiet, catchExceptions)
-        game.run()
-        if not beQuiet: games.append(game)
-
         if record:
-            import time, pickle
-            fname = ('recorded-game-%d' % (i + 1)) +  '-'.join([str(t) for t in time.localtime()[1:6]])
-            f = open(fname, 'wb')
-            components = {'layout': layout, 'actions': game.moveHistory}
-            pickle.dump(components, f)
-            f.close()
+            import gameRecords
+            numGhosts = len(game.state.data.agentStates) - 1
+            game.recorder = gameRecords.GameRecorder(gameRecords.recordFileName(i + 1), layout, numGhosts)
+        try: game.run()
+        finally:
+            if game.recorder is not None: game.recorder.close()
+        if not beQuiet: results.append(gameResult(game, i))
 
     if (numGames-numTraining) > 0:
-        scores = [game.state.getScore() for game in games]
-        wins = [game.state.isWin() for game in games]
+        scores = [result['score'] for result in results]
+        wins = [result['win'] for result in results]
         winRate = wins.count(True)/ float(len(wins))
         print('Average Score:', sum(scores) / float(len(scores)))
         print('Scores:       ', ', '.join([str(score) for score in scores]))
         print('Win Rate:      %d/%d (%.2f)' % (wins.count(True), len(wins), winRate))
         print('Record:       ', ', '.join([ ['Loss', 'Win'][int(w)] for w in wins]))
 
-    return games
+    return results
+
+def gameResult(game, index):
+    """
+    The score, outcome and counters of finished game number index. Batches
+    keep these rather than the games, so that the states and move histories
+    of played games are freed.
+    """
+    return {'index': index, 'score': game.state.getScore(), 'win': game.state.isWin(),
+            'moves': game.numActions, 'agentTimes': game.totalAgentTimes, 'crashed': game.agentCrashed}
+
+def _runBatchGame(job):
+    """
+    Plays one game of a batch without display and returns its results. Runs
+    in a worker process, so the agents are built here from their types.
+    """
+    index, seed, layout, pacmanType, agentOpts, ghostType, numGhosts, record, catchExceptions, timeout = job
+    import textDisplay
+    random.seed(seed)
+    pacman = pacmanType(**agentOpts)
+    ghosts = [ghostType(i+1) for i in range(numGhosts)]
+    rules = ClassicGameRules(timeout)
+    game = rules.newGame(layout, pacman, ghosts, textDisplay.NullGraphics(), True, catchExceptions)
+    if record:
+        import gameRecords
+        numGhosts = len(game.state.data.agentStates) - 1
+        game.recorder = gameRecords.GameRecorder(gameRecords.recordFileName(index + 1), layout, numGhosts)
+    try: game.run()
+    finally:
+        if game.recorder is not None: game.recorder.close()
+    result = gameResult(game, index)
+    result['seed'] = seed
+    return result
+
+def runBatch( layout, pacmanType, agentOpts, ghostType, numGhosts, numGames, jobs, seed=0, numTraining=0,
+              record=False, catchExceptions=False, timeout=30 ):
+    """
+    Plays numGames games without display over a pool of jobs worker
+    processes. Game i is seeded with seed + i, so a batch gives the same
+    results whatever the number of workers. Prints and returns the results
+    of the games after the first numTraining, in order.
+    """
+    import multiprocessing
+    jobsArgs = [(i, seed + i, layout, pacmanType, agentOpts, ghostType, numGhosts, record, catchExceptions, timeout)
+                for i in range(numGames)]
+    pool = multiprocessing.Pool(jobs)
+    try:
+        results = pool.map(_runBatchGame, jobsArgs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    results = results[numTraining:]
+    if len(results) > 0:
+        scores = [result['score'] for result in results]
+        wins = [result['win'] for result in results]
+        moves = [result['moves'] for result in results]
+        numAgents = max(len(result['agentTimes']) for result in results)
+        agentTimes = [sum(result['agentTimes'][i] for result in results if i < len(result['agentTimes']))
+                      for i in range(numAgents)]
+        print('Average Score:', sum(scores) / float(len(scores)))
+        print('Scores:       ', ', '.join([str(score) for score in scores]))
+        print('Win Rate:      %d/%d (%.2f)' % (wins.count(True), len(wins), wins.count(True) / float(len(wins))))
+        print('Record:       ', ', '.join([ ['Loss', 'Win'][int(w)] for w in wins]))
+        print('Average Moves:', sum(moves) / float(len(moves)))
+        print('Agent Times:  ', ', '.join(['%d: %.3fs' % (i, t / len(results)) for i, t in enumerate(agentTimes)]),
+              '(average per game)')
+        crashes = [result['index'] for result in results if result['crashed']]
+        if crashes: print('Crashed games:', ', '.join([str(i) for i in crashes]))
+
+    return results
 
 if __name__ == '__main__':
     """
@@ -677,7 +793,10 @@ if __name__ == '__main__':
     > python pacman.py --help
     """
     args = readCommand( sys.argv[1:] ) # Get game components based on input
-    runGames( **args )
+    if 'jobs' in args:
+        runBatch( **args )
+    else:
+        runGames( **args )
 
     # import cProfile
     # cProfile.run("runGames( **args )")
@@ -20,6 +20,8 @@ Pacman agents (in searchAgents.py).
 from custom_types import Direction
 from pacman import GameState
 from typing import Any, Tuple,List
+import random
+import time
 import util
 
 """
@@ -81,6 +83,68 @@ def tinyMazeSearch(problem:SearchProblem)->List[Direction]:
     w = Directions.WEST
     return  [s, s, w, s, w, w, s, w]
 
+def _reconstructPath(node:tuple)->List[Direction]:
+    """
+    Follows the parent pointers of a search node back to the root and returns
+    the actions leading from the start state to the node's state.
+    """
+    actions = []
+    while node[2] is not None:
+        actions.append(node[1])
+        node = node[2]
+    actions.reverse()
+    return actions
+
+def _graphSearch(problem:SearchProblem, frontier, heuristic=None)->List[Direction]:
+    """
+    Graph search shared by every search function of this file.
+
+    Search nodes are tuples (state, action, parent, pathCost): each node only
+    points to the node it was generated from, so pushing a successor is O(1)
+    and the plan is rebuilt once, when a goal is popped. The closed set is a
+    hashed set, so states must be hashable.
+
+    frontier is a util.Stack or util.Queue, or a util.PriorityQueue when a
+    heuristic is given, in which case nodes are ordered by pathCost + h. The
+    priority queue never has its entries updated: a table of the best path
+    cost found for each state decides whether a successor is worth pushing,
+    and entries superseded by a cheaper path are dropped when popped.
+    """
+    closed = set()
+    frontier_push = frontier.push
+    statistics = getattr(problem, 'searchStatistics', None)
+    root = (problem.getStartState(), None, None, 0)
+    if heuristic is None:
+        frontier_push(root)
+    else:
+        bestCost = {root[0]: 0}
+        frontier_push(root, 0)
+
+    while not frontier.isEmpty():
+        node = frontier.pop()
+        state, _, _, cost = node
+        if heuristic is not None and cost > bestCost[state]:
+            continue
+        if problem.isGoalState(state):
+            return _reconstructPath(node)
+
+        if state in closed:
+            continue
+        closed.add(state)
+        if statistics is not None:
+            statistics.recordSizes(len(frontier), len(closed))
+        for child, direction, step_cost in problem.getSuccessors(state):
+            if child in closed:
+                continue
+            child_cost = cost + step_cost
+            if heuristic is None:
+                frontier_push((child, direction, node, child_cost))
+            elif child_cost < bestCost.get(child, float('inf')):
+                bestCost[child] = child_cost
+                frontier_push((child, direction, node, child_cost), child_cost + heuristic(child, problem))
+
+    return []
+
 def depthFirstSearch(problem:SearchProblem)->List[Direction]:
     """
     Search the deepest nodes in the search tree first.
@@ -99,27 +163,7 @@ def depthFirstSearch(problem:SearchProblem)->List[Direction]:
     '''
         INSÉREZ VOTRE SOLUTION À LA QUESTION 1 ICI
     '''
-    visited = []
-    stack = util.Stack() 
-    stack.push(problem.getStartState())
-    currPath = util.Stack() 
-    currPath.push([])  
-
-
-    while not stack.isEmpty():  
-        state = stack.pop()  
-        path = currPath.pop() 
-        if problem.isGoalState(state): 
-            return path
-
-        if state not in visited:  
-            visited.append(state) 
-            for child, direction, cost in problem.getSuccessors(state):  
-                if child not in visited: 
-                    stack.push(child)  
-                    currPath.push(path + [direction])  
-
-    return []
+    return _graphSearch(problem, util.Stack())
 
 
 def breadthFirstSearch(problem:SearchProblem)->List[Direction]:
@@ -129,27 +173,7 @@ def breadthFirstSearch(problem:SearchProblem)->List[Direction]:
     '''
         INSÉREZ VOTRE SOLUTION À LA QUESTION 2 ICI
     '''
-    visited = []
-    queue = util.Queue() 
-    queue.push(problem.getStartState())
-    currPath = util.Queue() 
-    currPath.push([])  
-
-
-    while not queue.isEmpty():  
-        state = queue.pop()  
-        path = currPath.pop() 
-        if problem.isGoalState(state): 
-            return path
-
-        if state not in visited:  
-            visited.append(state) 
-            for child, direction, cost in problem.getSuccessors(state):  
-                if child not in visited: 
-                    queue.push(child)  
-                    currPath.push(path + [direction])  
-
-    return []
+    return _graphSearch(problem, util.Queue())
 
 def uniformCostSearch(problem:SearchProblem)->List[Direction]:
     """Search the node of least total cost first."""
@@ -158,26 +182,7 @@ def uniformCostSearch(problem:SearchProblem)->List[Direction]:
     '''
         INSÉREZ VOTRE SOLUTION À LA QUESTION 3 ICI
     '''
-    visited = []
-    heap = util.PriorityQueue()
-    heap.push((problem.getStartState(), 0), 0)
-    currPath = util.PriorityQueue() 
-    currPath.push([], 0) 
-
-    while not heap.isEmpty():
-        state, cost = heap.pop()
-        path = currPath.pop()
-        if problem.isGoalState(state):
-            return path
-        if state not in visited:
-            visited.append(state)
-            for child, direction, step_cost in problem.getSuccessors(state):
-                if child not in visited:
-                    new_cost = problem.getCostOfActions(path + [direction])
-                    heap.push((child, cost + step_cost), new_cost)
-                    currPath.push(path + [direction], new_cost)
-
-    return []
+    return _graphSearch(problem, util.PriorityQueue(), nullHeuristic)
 
 def nullHeuristic(state:GameState, problem:SearchProblem=None)->List[Direction]:
     """
@@ -191,31 +196,570 @@ def aStarSearch(problem:SearchProblem, heuristic=nullHeuristic)->List[Direction]
     '''
         INSÉREZ VOTRE SOLUTION À LA QUESTION 4 ICI
     '''
-    visited = []
-    heap = util.PriorityQueue()  
-    heap.push(problem.getStartState(), 0)
-    currPath = util.PriorityQueue() 
-    currPath.push([], 0)  
-
-
-    while not heap.isEmpty():  
-        state = heap.pop()  
-        path = currPath.pop() 
-        if problem.isGoalState(state): 
-            return path
-
-        if state not in visited:  
-            visited.append(state) 
-            for child, direction, cost in problem.getSuccessors(state):  
-                if child not in visited: 
-                    newCost = problem.getCostOfActions(path + [direction]) + heuristic(child, problem)  
-                    heap.push(child, newCost)  
-                    currPath.push(path + [direction], newCost)  
+    return _graphSearch(problem, util.PriorityQueue(), heuristic)
+
+IDA_TABLE_SIZE = 1000000
+SMA_NODE_BUDGET = 100000
+
+def _recordPeakMemory(problem:SearchProblem, search, *args)->List[Direction]:
+    """
+    Runs search(*args) while tracing memory allocations and stores the peak
+    traced size, in bytes, in problem._peakMemory.
+    """
+    import tracemalloc
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        return search(*args)
+    finally:
+        problem._peakMemory = tracemalloc.get_traced_memory()[1]
+        if not tracing:
+            tracemalloc.stop()
+
+def iterativeDeepeningAStarSearch(problem:SearchProblem, heuristic=nullHeuristic, tableSize=IDA_TABLE_SIZE,
+                                  recordMemory=False)->List[Direction]:
+    """
+    Depth first searches bounded by the cost plus heuristic of their nodes,
+    the bound growing to the smallest value that exceeded it until a goal is
+    found. Only the current path is kept in memory, along with a
+    transposition table of at most tableSize states holding the cheapest
+    cost each state was reached with during the current iteration, which
+    prunes paths reaching a state again at no lower cost.
+
+    With an admissible heuristic the plan is optimal. Nodes are expanded
+    again at each iteration and problem._expanded counts every expansion.
+    If recordMemory is set, the peak memory of the search is stored in
+    problem._peakMemory.
+    """
+    if recordMemory:
+        return _recordPeakMemory(problem, iterativeDeepeningAStarSearch, problem, heuristic, tableSize)
+
+    start = problem.getStartState()
+    if problem.isGoalState(start):
+        return []
+    bound = heuristic(start, problem)
+    statistics = getattr(problem, 'searchStatistics', None)
+    while bound != float('inf'):
+        nextBound = float('inf')
+        table = {start: 0}
+        onPath = {start}
+        actions = []
+        # Each frame is [state, cost, successors, index of the next successor].
+        stack = [[start, 0, problem.getSuccessors(start), 0]]
+        while stack:
+            frame = stack[-1]
+            state, cost, successors, index = frame
+            if index == len(successors):
+                stack.pop()
+                onPath.discard(state)
+                if actions: actions.pop()
+                continue
+            frame[3] += 1
+            child, direction, stepCost = successors[index]
+            childCost = cost + stepCost
+            if child in onPath or table.get(child, float('inf')) <= childCost:
+                continue
+            if child in table or len(table) < tableSize:
+                table[child] = childCost
+            f = childCost + heuristic(child, problem)
+            if f > bound:
+                nextBound = min(nextBound, f)
+                continue
+            actions.append(direction)
+            if problem.isGoalState(child):
+                return actions
+            onPath.add(child)
+            stack.append([child, childCost, problem.getSuccessors(child), 0])
+            if statistics is not None:
+                statistics.recordSizes(len(stack), len(table))
+        bound = nextBound
+    return []
+
+class _SMANode:
+    """
+    A node of simplifiedMemoryBoundedAStarSearch. children holds its
+    successors in memory and forgotten the backed up f of the successors
+    that were removed from memory, both by state.
+    """
+    __slots__ = ('state', 'action', 'parent', 'cost', 'depth', 'f', 'children', 'forgotten')
+
+    def __init__(self, state, action, parent, cost, f):
+        self.state = state
+        self.action = action
+        self.parent = parent
+        self.cost = cost
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.f = f
+        self.children = {}
+        self.forgotten = {}
+
+    def forgottenF(self):
+        "The lowest f among the forgotten successors worth generating again."
+        return min(self.forgotten.values(), default=float('inf'))
+
+def simplifiedMemoryBoundedAStarSearch(problem:SearchProblem, heuristic=nullHeuristic, nodeBudget=SMA_NODE_BUDGET,
+                                       recordMemory=False)->List[Direction]:
+    """
+    A* keeping at most nodeBudget search nodes in memory (SMA*). When the
+    budget is exceeded, the leaf with the highest f (the shallowest among
+    ties) is forgotten and its f is backed up in its parent, which goes back
+    to the frontier so that the forgotten subtree can be generated again,
+    with that f, if it becomes the most promising one.
+
+    With an admissible heuristic the plan is optimal as long as the budget
+    can hold the path to the shallowest optimal goal; nodes deeper than that
+    get an infinite f and the search returns [] when nothing else is left,
+    instead of exhausting the memory. If recordMemory is set, the peak
+    memory of the search is stored in problem._peakMemory.
+    """
+    if recordMemory:
+        return _recordPeakMemory(problem, simplifiedMemoryBoundedAStarSearch, problem, heuristic, nodeBudget)
+
+    infinity = float('inf')
+    start = problem.getStartState()
+    root = _SMANode(start, None, None, 0, heuristic(start, problem))
+    # The frontier pops the lowest f, deepest first; leaves pops the frontier
+    # nodes without children in memory by highest f, shallowest first.
+    frontier, leaves = util.IndexedPriorityQueue(), util.IndexedPriorityQueue()
+    frontier.push(root, (root.f, -root.depth))
+    inMemory = {start: root}
+    size = 1
+    statistics = getattr(problem, 'searchStatistics', None)
+
+    def backup(node):
+        # Propagates the lowest f below node up to the root.
+        while node is not None:
+            f = min([child.f for child in node.children.values()] + [node.forgottenF()])
+            if f == node.f:
+                return
+            node.f = f
+            node = node.parent
+
+    def forget(node):
+        # Removes the leaf node from memory and remembers its f in its parent,
+        # which goes back to the frontier to generate it again later. Parents
+        # left with nothing worth generating are dead ends and removed too.
+        nonlocal size
+        while True:
+            size -= 1
+            if inMemory.get(node.state) is node:
+                del inMemory[node.state]
+            parent = node.parent
+            del parent.children[node.state]
+            parent.forgotten[node.state] = node.f
+            backup(parent)
+            if parent.children or parent.f != infinity or parent is root:
+                break
+            node = parent
+        if parent.forgottenF() != infinity:
+            frontier.push(parent, (parent.forgottenF(), -parent.depth))
+            if not parent.children:
+                leaves.push(parent, (-parent.f, parent.depth))
+
+    while not frontier.isEmpty():
+        node = frontier.pop()
+        if node in leaves:
+            leaves.remove(node)
+        if (node.forgottenF() if node.children or node.forgotten else node.f) == infinity:
+            return []
+        if problem.isGoalState(node.state):
+            actions = []
+            while node.parent is not None:
+                actions.append(node.action)
+                node = node.parent
+            actions.reverse()
+            return actions
+
+        for child, direction, stepCost in problem.getSuccessors(node.state):
+            childCost = node.cost + stepCost
+            known = inMemory.get(child)
+            if child in node.children or (known is not None and known.cost <= childCost):
+                continue
+            f = max(node.f, childCost + heuristic(child, problem), node.forgotten.pop(child, 0))
+            if f == infinity:
+                node.forgotten[child] = f
+                continue
+            childNode = _SMANode(child, direction, node, childCost, f)
+            if childNode.depth >= nodeBudget - 1 and not problem.isGoalState(child):
+                # Its children could not be held in memory with its path.
+                childNode.f = infinity
+            node.children[child] = childNode
+            inMemory[child] = childNode
+            frontier.push(childNode, (childNode.f, -childNode.depth))
+            leaves.push(childNode, (-childNode.f, childNode.depth))
+            size += 1
+
+        if statistics is not None:
+            statistics.recordSizes(len(frontier), size)
+        if node.children:
+            backup(node)
+        elif node is not root:
+            # Dead end: nothing below it is worth keeping.
+            node.f = infinity
+            forget(node)
+
+        while size > nodeBudget and not leaves.isEmpty():
+            worst = leaves.pop()
+            if worst.parent is node and len(node.children) == 1:
+                # Always keep a child of the node just expanded, so that the
+                # search goes deeper instead of generating it again forever.
+                leaves.push(worst, (-worst.f, worst.depth))
+                break
+            frontier.remove(worst)
+            forget(worst)
 
     return []
 
+def _followParents(parents:dict, state:Any)->List[Direction]:
+    """
+    Returns the actions leading to state in a map state -> (parent, action)
+    filled by a search whose root is mapped to (None, None).
+    """
+    actions = []
+    parent, action = parents[state]
+    while parent is not None:
+        actions.append(action)
+        parent, action = parents[parent]
+    actions.reverse()
+    return actions
+
+def bidirectionalSearch(problem:SearchProblem)->List[Direction]:
+    """
+    Breadth first search run at the same time from the start state and from
+    problem.goal, which meet halfway and so expand far fewer nodes than bfs
+    on point to point searches.
+
+    The problem must have a single goal state, problem.goal, and its moves
+    must all cost the same and be reversible, as in a PositionSearchProblem
+    with the default costFn. Whole layers of the smaller frontier are
+    expanded at a time and the shortest path through the meetings found in
+    the layer is kept, so the plan has the same length as the one of ucs.
+    """
+    from game import Actions
+    start, goal = problem.getStartState(), problem.goal
+    if problem.isGoalState(start):
+        return []
+    forward, backward = {start: (None, None)}, {goal: (None, None)}
+    forwardLayer, backwardLayer = [start], [goal]
+    forwardDepth = backwardDepth = 0
+    statistics = getattr(problem, 'searchStatistics', None)
+
+    while forwardLayer and backwardLayer:
+        expandForward = len(forwardLayer) <= len(backwardLayer)
+        if expandForward:
+            layer, parents, others = forwardLayer, forward, backward
+        else:
+            layer, parents, others = backwardLayer, backward, forward
+        nextLayer, meeting = [], None
+        for state in layer:
+            for child, direction, _ in problem.getSuccessors(state):
+                if child in parents:
+                    continue
+                parents[child] = (state, direction)
+                nextLayer.append(child)
+                if child in others and meeting is None:
+                    meeting = child
+        if expandForward:
+            forwardLayer, forwardDepth = nextLayer, forwardDepth + 1
+        else:
+            backwardLayer, backwardDepth = nextLayer, backwardDepth + 1
+        if statistics is not None:
+            statistics.recordSizes(len(forwardLayer) + len(backwardLayer), len(forward) + len(backward))
+
+        if meeting is not None:
+            # Every meeting of this layer joins two paths of the same total
+            # length, forwardDepth + backwardDepth: any of them is optimal.
+            actions = _followParents(forward, meeting)
+            backwardActions = _followParents(backward, meeting)
+            actions.extend(Actions.reverseDirection(action) for action in reversed(backwardActions))
+            return actions
+
+    return []
+
+def jumpPointSearch(problem:SearchProblem)->List[Direction]:
+    """
+    A* on the jump points of a grid: straight runs of cells without any
+    decision to take are skipped in a single step, so only the cells where
+    the path may turn are expanded. Each expanded jump point adds one to
+    problem._expanded.
+
+    The problem must be a point to point search on problem.walls towards
+    problem.goal where every move costs 1, like a PositionSearchProblem with
+    the default costFn. The plan has the same length as the one of ucs.
+    """
+    from game import Directions
+    walls, goal = problem.walls, problem.goal
+    width, height = walls.width, walls.height
+
+    def isOpen(x, y):
+        return 0 <= x < width and 0 <= y < height and not walls[x][y]
+
+    def jumpHorizontally(x, y, dx):
+        # Moving along a row stops on the goal and next to a wall corner
+        # opening a way up or down (a forced neighbor).
+        while True:
+            x += dx
+            if not isOpen(x, y): return None
+            if (x, y) == goal: return (x, y)
+            if (isOpen(x, y - 1) and not isOpen(x - dx, y - 1)) or (isOpen(x, y + 1) and not isOpen(x - dx, y + 1)):
+                return (x, y)
+
+    def jumpVertically(x, y, dy):
+        # Moving along a column also stops where a horizontal jump succeeds,
+        # since turns are only considered at jump points.
+        while True:
+            y += dy
+            if not isOpen(x, y): return None
+            if (x, y) == goal: return (x, y)
+            if (isOpen(x - 1, y) and not isOpen(x - 1, y - dy)) or (isOpen(x + 1, y) and not isOpen(x + 1, y - dy)):
+                return (x, y)
+            if jumpHorizontally(x, y, 1) or jumpHorizontally(x, y, -1):
+                return (x, y)
+
+    def prunedDirections(position, parent):
+        if parent is None:
+            return [(1, 0), (-1, 0), (0, 1), (0, -1)]
+        dx = (position[0] > parent[0]) - (position[0] < parent[0])
+        dy = (position[1] > parent[1]) - (position[1] < parent[1])
+        if dx != 0:
+            return [(dx, 0), (0, 1), (0, -1)]
+        return [(0, dy), (1, 0), (-1, 0)]
+
+    def distanceToGoal(position):
+        return abs(position[0] - goal[0]) + abs(position[1] - goal[1])
+
+    start = problem.getStartState()
+    parents = {start: None}
+    bestCost = {start: 0}
+    closed = set()
+    frontier = util.PriorityQueue()
+    frontier.push((start, 0), distanceToGoal(start))
+    statistics = getattr(problem, 'searchStatistics', None)
+    while not frontier.isEmpty():
+        position, cost = frontier.pop()
+        if cost > bestCost[position] or position in closed:
+            continue
+        if position == goal:
+            break
+        closed.add(position)
+        problem._expanded += 1
+        if statistics is not None:
+            statistics.recordSizes(len(frontier), len(closed))
+        x, y = position
+        for dx, dy in prunedDirections(position, parents[position]):
+            jumpPoint = jumpHorizontally(x, y, dx) if dx != 0 else jumpVertically(x, y, dy)
+            if jumpPoint is None or jumpPoint in closed:
+                continue
+            jumpCost = cost + abs(jumpPoint[0] - x) + abs(jumpPoint[1] - y)
+            if jumpCost < bestCost.get(jumpPoint, float('inf')):
+                bestCost[jumpPoint] = jumpCost
+                parents[jumpPoint] = position
+                frontier.push((jumpPoint, jumpCost), jumpCost + distanceToGoal(jumpPoint))
+    else:
+        return []
+
+    # Unfold the straight segments between consecutive jump points.
+    actions = []
+    position = goal
+    while parents[position] is not None:
+        parent = parents[position]
+        dx, dy = position[0] - parent[0], position[1] - parent[1]
+        if dx > 0: direction = Directions.EAST
+        elif dx < 0: direction = Directions.WEST
+        elif dy > 0: direction = Directions.NORTH
+        else: direction = Directions.SOUTH
+        actions.extend([direction] * (abs(dx) + abs(dy)))
+        position = parent
+    actions.reverse()
+    return actions
+
+class SearchStatistics:
+    """
+    What a search did, as recorded by instrumentedSearch: the nodes expanded
+    and generated, the peak sizes of the frontier and of the closed set, the
+    heuristic calls and the wall time of each phase in seconds.
+
+    The search functions of this file report their frontier and closed set
+    sizes after each expansion to problem.searchStatistics, when there is
+    one; what each size holds depends on the algorithm (IDA* reports its
+    path and transposition table, SMA* its frontier and nodes in memory).
+    """
+    def __init__(self, **labels):
+        self.labels = labels
+        self.expanded = 0
+        self.generated = 0
+        self.peakFrontier = 0
+        self.peakClosed = 0
+        self.heuristicCalls = 0
+        self.phases = {}
+
+    def recordSizes(self, frontierSize, closedSize):
+        if frontierSize > self.peakFrontier: self.peakFrontier = frontierSize
+        if closedSize > self.peakClosed: self.peakClosed = closedSize
+
+    def addTime(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def asDict(self):
+        statistics = dict(self.labels)
+        statistics.update(expanded=self.expanded, generated=self.generated, peakFrontier=self.peakFrontier,
+                          peakClosed=self.peakClosed, heuristicCalls=self.heuristicCalls,
+                          heuristicSeconds=self.phases.get('heuristic', 0.0), phases=dict(self.phases))
+        return statistics
+
+    def toJSON(self):
+        import json
+        return json.dumps(self.asDict(), indent=2)
+
+class InstrumentedProblem(SearchProblem):
+    """
+    Wraps a search problem to time its methods and count the expanded and
+    generated nodes into a SearchStatistics.  Other attributes are those of
+    the wrapped problem, so heuristics can be given the wrapper.
+    """
+    def __init__(self, problem:SearchProblem, statistics:SearchStatistics):
+        self.__dict__['problem'] = problem
+        self.__dict__['searchStatistics'] = statistics
+
+    def getStartState(self)->Any:
+        return self.problem.getStartState()
+
+    def isGoalState(self, state:Any)->bool:
+        start = time.perf_counter()
+        isGoal = self.problem.isGoalState(state)
+        self.searchStatistics.addTime('goalTest', time.perf_counter() - start)
+        return isGoal
+
+    def getSuccessors(self, state:Any)->List[Tuple[Any,Direction,int]]:
+        start = time.perf_counter()
+        successors = self.problem.getSuccessors(state)
+        statistics = self.searchStatistics
+        statistics.addTime('successors', time.perf_counter() - start)
+        statistics.expanded += 1
+        statistics.generated += len(successors)
+        return successors
+
+    def getCostOfActions(self, actions:List[Direction])->int:
+        return self.problem.getCostOfActions(actions)
+
+    def __getattr__(self, name):
+        return getattr(self.problem, name)
+
+    def __setattr__(self, name, value):
+        # Searches like jumpPointSearch update problem._expanded themselves.
+        setattr(self.problem, name, value)
+
+def instrumentedSearch(problem:SearchProblem, searchFunction, heuristic=None,
+                       statistics:SearchStatistics=None)->Tuple[List[Direction],SearchStatistics]:
+    """
+    Runs searchFunction on problem, with heuristic if one is given, and
+    returns its plan together with the SearchStatistics of the search.
+
+    The time spent in the heuristic, the goal test and the successor
+    function is reported in the phases 'heuristic', 'goalTest' and
+    'successors'; 'search' is the whole search, the rest of it being the
+    search function's own work.  Searches that do not expand nodes through
+    getSuccessors, like jumpPointSearch, have their expansions taken from
+    problem._expanded.
+    """
+    if statistics is None:
+        statistics = SearchStatistics()
+    instrumented = InstrumentedProblem(problem, statistics)
+    expandedBefore = getattr(problem, '_expanded', None)
+    start = time.perf_counter()
+    if heuristic is None:
+        actions = searchFunction(instrumented)
+    else:
+        def timedHeuristic(state, problem=None):
+            heuristicStart = time.perf_counter()
+            value = heuristic(state, problem)
+            statistics.addTime('heuristic', time.perf_counter() - heuristicStart)
+            statistics.heuristicCalls += 1
+            return value
+        actions = searchFunction(instrumented, heuristic=timedHeuristic)
+    statistics.addTime('search', time.perf_counter() - start)
+    if statistics.expanded == 0 and expandedBefore is not None:
+        statistics.expanded = problem._expanded - expandedBefore
+    return actions, statistics
+
+HEURISTIC_CACHE_SIZE = 100000
+
+class CachedHeuristic:
+    """
+    Memoizes a heuristic by state in a util.LRUCache of at most maxSize
+    states, so that a state generated many times has its heuristic computed
+    once.  The values are cached for one problem: make a new CachedHeuristic
+    for each search.
+
+    The graph searches already call the heuristic about once per state, when
+    its best cost improves, so for aStarSearch the cache is nearly never hit.
+    It pays off for iterativeDeepeningAStarSearch, which searches the same
+    states again at every threshold, and a little for
+    simplifiedMemoryBoundedAStarSearch, which regenerates forgotten states.
+    """
+    def __init__(self, heuristic, maxSize=HEURISTIC_CACHE_SIZE):
+        self.heuristic = heuristic
+        self.cache = util.LRUCache(maxSize)
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, state, problem=None):
+        value = self.cache.get(state)
+        if value is None:
+            self.misses += 1
+            value = self.cache[state] = self.heuristic(state, problem)
+        else:
+            self.hits += 1
+        return value
+
+class ConsistencyCheckingProblem(SearchProblem):
+    """
+    Wraps a search problem to check that heuristic is consistent on a sample
+    of its edges: for a fraction sampleRate of the expanded states s, every
+    edge (s, s', c) must satisfy h(s) <= c + h(s').  The edges that do not
+    are kept in violations as (s, s', c, h(s), h(s')) and checked counts the
+    edges looked at.  Other attributes are those of the wrapped problem.
+    """
+    TOLERANCE = 1e-9
+
+    def __init__(self, problem:SearchProblem, heuristic, sampleRate:float, seed:int=0):
+        self.__dict__.update(problem=problem, heuristic=heuristic, sampleRate=sampleRate,
+                             random=random.Random(seed), checked=0, violations=[])
+
+    def getStartState(self)->Any:
+        return self.problem.getStartState()
+
+    def isGoalState(self, state:Any)->bool:
+        return self.problem.isGoalState(state)
+
+    def getSuccessors(self, state:Any)->List[Tuple[Any,Direction,int]]:
+        successors = self.problem.getSuccessors(state)
+        if self.random.random() < self.sampleRate:
+            h = self.heuristic(state, self.problem)
+            for child, _, cost in successors:
+                childH = self.heuristic(child, self.problem)
+                self.__dict__['checked'] += 1
+                if h > cost + childH + self.TOLERANCE:
+                    self.violations.append((state, child, cost, h, childH))
+        return successors
+
+    def getCostOfActions(self, actions:List[Direction])->int:
+        return self.problem.getCostOfActions(actions)
+
+    def __getattr__(self, name):
+        return getattr(self.problem, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.problem, name, value)
+
 # Abbreviations
 bfs = breadthFirstSearch
 dfs = depthFirstSearch
 astar = aStarSearch
 ucs = uniformCostSearch
+bibfs = bidirectionalSearch
+jps = jumpPointSearch
+idastar = iterativeDeepeningAStarSearch
+smastar = simplifiedMemoryBoundedAStarSearch
@@ -42,6 +42,7 @@ from game import Actions
 import util
 import time
 import search
+from array import array
 
 class GoWestAgent(Agent):
     "An agent that goes West until it can't."
@@ -70,18 +71,42 @@ class SearchAgent(Agent):
     Options for fn include:
       depthFirstSearch or dfs
       breadthFirstSearch or bfs
+      bidirectionalSearch or bibfs
+      jumpPointSearch or jps
+      iterativeDeepeningAStarSearch or idastar
+      simplifiedMemoryBoundedAStarSearch or smastar
 
+    With stats=print, the search statistics (see search.instrumentedSearch)
+    are printed as JSON; with stats=<file> they are written to that file.
+
+    With heuristicCache=<size>, the heuristic values of the last <size>
+    states are memoized (see search.CachedHeuristic); this helps idastar and
+    smastar, which revisit states, far more than astar.  With
+    checkConsistency=<rate>, that fraction of the expanded states has its
+    edges checked for h(s) <= c + h(s') and the violations are reported.
 
     Note: You should NOT change any code in SearchAgent
     """
-
-    def __init__(self, fn='depthFirstSearch', prob='PositionSearchProblem', heuristic='nullHeuristic'):
+    # Subclasses setting searchFunction themselves use none of the options
+    searchMethod = None
+    heuristic = None
+    stats = None
+    heuristicCache = 0
+    checkConsistency = 0
+
+    def __init__(self, fn='depthFirstSearch', prob='PositionSearchProblem', heuristic='nullHeuristic', stats=None,
+                 heuristicCache=0, checkConsistency=0):
         # Warning: some advanced Python magic is employed below to find the right functions and problems
 
         # Get the search function from the name and heuristic
         if fn not in dir(search):
             raise AttributeError(fn + ' is not a search function in search.py.')
         func = getattr(search, fn)
+        self.searchMethod = func
+        self.stats = stats
+        self.statsLabels = {'function': fn, 'problem': prob}
+        self.heuristicCache = int(heuristicCache)
+        self.checkConsistency = float(checkConsistency)
         if 'heuristic' not in func.__code__.co_varnames:
             print('[SearchAgent] using function ' + fn)
             self.searchFunction = func
@@ -95,6 +120,8 @@ class SearchAgent(Agent):
             print('[SearchAgent] using function %s and heuristic %s' % (fn, heuristic))
             # Note: this bit of Python trickery combines the search algorithm and the heuristic
             self.searchFunction = lambda x: func(x, heuristic=heur)
+            self.heuristic = heur
+            self.statsLabels['heuristic'] = heuristic
 
         # Get the search problem type from the name
         if prob not in globals().keys() or not prob.endswith('Problem'):
@@ -114,10 +141,41 @@ class SearchAgent(Agent):
         if self.searchFunction == None: raise Exception("No search function provided for SearchAgent")
         starttime = time.time()
         problem = self.searchType(state) # Makes a new search problem
-        self.actions  = self.searchFunction(problem) # Find a path
+        heuristic, searchProblem = self.heuristic, problem
+        if heuristic != None and self.heuristicCache > 0:
+            heuristic = search.CachedHeuristic(heuristic, self.heuristicCache)
+        if heuristic != None and self.checkConsistency > 0:
+            # The checker calls the bare heuristic, so that the cache only counts the calls of the search
+            searchProblem = search.ConsistencyCheckingProblem(problem, self.heuristic, self.checkConsistency)
+
+        if self.stats:
+            statistics = search.SearchStatistics(**self.statsLabels)
+            statistics.addTime('problem', time.time() - starttime)
+            self.actions, statistics = search.instrumentedSearch(searchProblem, self.searchMethod, heuristic, statistics)
+        elif heuristic is not self.heuristic or searchProblem is not problem:
+            self.actions = self.searchMethod(searchProblem, heuristic=heuristic)
+        else:
+            self.actions  = self.searchFunction(problem) # Find a path
         totalCost = problem.getCostOfActions(self.actions)
         print('Path found with total cost of %d in %.1f seconds' % (totalCost, time.time() - starttime))
         if '_expanded' in dir(problem): print('Search nodes expanded: %d' % problem._expanded)
+        if '_peakMemory' in dir(problem): print('Peak search memory: %d bytes' % problem._peakMemory)
+        if isinstance(heuristic, search.CachedHeuristic):
+            print('Heuristic cache: %d hits, %d misses' % (heuristic.hits, heuristic.misses))
+        if searchProblem is not problem:
+            print('Consistency check: %d edges checked, %d violations' % (searchProblem.checked, len(searchProblem.violations)))
+            for parent, child, cost, h, childH in searchProblem.violations[:10]:
+                print('  h(%s) = %s > %s + h(%s) = %s' % (parent, h, cost, child, cost + childH))
+        if self.stats:
+            statistics.labels.update(pathCost=totalCost, pathLength=len(self.actions))
+            if isinstance(heuristic, search.CachedHeuristic):
+                statistics.labels.update(heuristicCacheHits=heuristic.hits, heuristicCacheMisses=heuristic.misses)
+            if self.stats == 'print':
+                print(statistics.toJSON())
+            else:
+                with open(self.stats, 'w') as f:
+                    f.write(statistics.toJSON() + '\n')
+                print('Search statistics written to ' + self.stats)
 
     def getAction(self, state):
         """
@@ -155,6 +213,7 @@ class PositionSearchProblem(search.SearchProblem):
         goal: A position in the gameState
         """
         self.walls = gameState.getWalls()
+        self.moves = Actions.getLegalMoveTable(self.walls).moves
         self.startState = gameState.getPacmanPosition()
         if start != None: self.startState = start
         self.goal = goal
@@ -195,14 +254,9 @@ class PositionSearchProblem(search.SearchProblem):
         """
 
         successors = []
-        for action in [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST]:
-            x,y = state
-            dx, dy = Actions.directionToVector(action)
-            nextx, nexty = int(x + dx), int(y + dy)
-            if not self.walls[nextx][nexty]:
-                nextState = (nextx, nexty)
-                cost = self.costFn(nextState)
-                successors.append( ( nextState, action, cost) )
+        for action, nextState in self.moves[state]:
+            cost = self.costFn(nextState)
+            successors.append( ( nextState, action, cost) )
 
         # Bookkeeping for display purposes
         self._expanded += 1 # DO NOT CHANGE
@@ -264,6 +318,58 @@ def euclideanHeuristic(position, problem, info={}):
     xy2 = problem.goal
     return ( (xy1[0] - xy2[0]) ** 2 + (xy1[1] - xy2[1]) ** 2 ) ** 0.5
 
+MAZE_DISTANCES_CACHE = {}
+
+class MazeDistances:
+    """
+    Shortest path lengths between every pair of open cells of a maze.
+
+    A breadth first search is run once from every open cell and the lengths
+    are stored in one flat array of unsigned shorts, so that mazeDistance is
+    two dict lookups and an array access.  Build it through getMazeDistances
+    so that it is only computed once per set of walls.
+    """
+    UNREACHABLE = 0xFFFF
+
+    def __init__(self, walls):
+        cells = walls.asList(False)
+        self.index = dict((cell, i) for i, cell in enumerate(cells))
+        self.size = size = len(cells)
+        neighbors = [[self.index[neighbor] for neighbor in Actions.getLegalNeighbors(cell, walls) if neighbor != cell]
+                     for cell in cells]
+        self.distances = distances = array('H', [self.UNREACHABLE]) * (size * size)
+        for source in range(size):
+            row = source * size
+            distances[row + source] = 0
+            frontier, distance = [source], 0
+            while frontier:
+                distance += 1
+                nextFrontier = []
+                for cell in frontier:
+                    for neighbor in neighbors[cell]:
+                        if distances[row + neighbor] == self.UNREACHABLE:
+                            distances[row + neighbor] = distance
+                            nextFrontier.append(neighbor)
+                frontier = nextFrontier
+
+    def mazeDistance(self, a, b):
+        "Returns the length of the shortest path between the open cells a and b"
+        distance = self.distances[self.index[a] * self.size + self.index[b]]
+        if distance == self.UNREACHABLE: return float('inf')
+        return distance
+
+def getMazeDistances(problem):
+    """
+    Returns the MazeDistances of the walls of problem.  They are stored in
+    problem.heuristicInfo and shared by all the problems on the same walls.
+    """
+    if 'mazeDistances' not in problem.heuristicInfo:
+        key = problem.walls.asBitGrid()
+        if key not in MAZE_DISTANCES_CACHE:
+            MAZE_DISTANCES_CACHE[key] = MazeDistances(problem.walls)
+        problem.heuristicInfo['mazeDistances'] = MAZE_DISTANCES_CACHE[key]
+    return problem.heuristicInfo['mazeDistances']
+
 #####################################################
 # This portion is incomplete.  Time to write code!  #
 #####################################################
@@ -273,6 +379,10 @@ class CornersProblem(search.SearchProblem):
     This search problem finds paths through all four corners of a layout.
 
     You must select a suitable state space and successor function
+
+    A state is a tuple (position, visitedCorners) where visitedCorners is a
+    4-bit mask, bit i being set once self.corners[i] has been visited. States
+    are small, immutable and hashable.
     """
 
     def __init__(self, startingGameState):
@@ -280,6 +390,7 @@ class CornersProblem(search.SearchProblem):
         Stores the walls, pacman's starting position and corners.
         """
         self.walls = startingGameState.getWalls()
+        self.moves = Actions.getLegalMoveTable(self.walls).moves
         self.startingPosition = startingGameState.getPacmanPosition()
         top, right = self.walls.height-2, self.walls.width-2
         self.corners = ((1,1), (1,top), (right, 1), (right, top))
@@ -289,7 +400,9 @@ class CornersProblem(search.SearchProblem):
         self._expanded = 0 # DO NOT CHANGE; Number of search nodes expanded
         # Please add any code here which you would like to use
         # in initializing the problem
-        self.cornerVisited = set()
+        self.heuristicInfo = {} # A dictionary for the heuristic to store information
+        self.cornerBits = dict((corner, 1 << i) for i, corner in enumerate(self.corners))
+        self.allCornersVisited = (1 << len(self.corners)) - 1
   
         '''
             INSÉREZ VOTRE SOLUTION À LA QUESTION 5 ICI
@@ -304,7 +417,7 @@ class CornersProblem(search.SearchProblem):
         '''
             INSÉREZ VOTRE SOLUTION À LA QUESTION 5 ICI
         '''
-        return (self.startingPosition, set())
+        return (self.startingPosition, self.cornerBits.get(self.startingPosition, 0))
         # util.raiseNotDefined()
 
     def isGoalState(self, state):
@@ -315,12 +428,7 @@ class CornersProblem(search.SearchProblem):
         '''
             INSÉREZ VOTRE SOLUTION À LA QUESTION 5 ICI
         '''
-        visitedCorners = state[1]
-        if state[0] in self.corners:
-            if state[0] not in visitedCorners:
-                visitedCorners.add(state)
-            return len(visitedCorners) == 4
-        return False
+        return state[1] == self.allCornersVisited
         # util.raiseNotDefined()
 
     def getSuccessors(self, state):
@@ -334,27 +442,14 @@ class CornersProblem(search.SearchProblem):
             is the incremental cost of expanding to that successor
         """
         successors = []
-        for action in [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST]:
-            # Add a successor state to the successor list if the action is legal
-            # Here's a code snippet for figuring out whether a new position hits a wall:
-            #   x,y = currentPosition
-            #   dx, dy = Actions.directionToVector(action)
-            #   nextx, nexty = int(x + dx), int(y + dy)
-            #   hitsWall = self.walls[nextx][nexty]
-           
-            '''
-                INSÉREZ VOTRE SOLUTION À LA QUESTION 5 ICI
-            '''
-            x, y = state[0]
-
-            dx, dy = Actions.directionToVector(action)
-            nextx, nexty = int(x + dx), int(y + dy)
-            if not self.walls[nextx][nexty]:
-                visitedCorners = state[1].copy()
-                if (nextx, nexty) in self.corners:
-                    if (nextx, nexty) not in visitedCorners:
-                        visitedCorners.add((nextx, nexty))
-                successors.append((((nextx, nexty), visitedCorners ), action, 1))
+        '''
+            INSÉREZ VOTRE SOLUTION À LA QUESTION 5 ICI
+        '''
+        # self.moves holds the legal (action, next position) pairs of every cell
+        position, visitedCorners = state
+        for action, nextPosition in self.moves[position]:
+            nextVisited = visitedCorners | self.cornerBits.get(nextPosition, 0)
+            successors.append(((nextPosition, nextVisited), action, 1))
 
         self._expanded += 1 # DO NOT CHANGE
         return successors
@@ -391,20 +486,18 @@ def cornersHeuristic(state, problem):
     '''
         INSÉREZ VOTRE SOLUTION À LA QUESTION 6 ICI
     '''
-    x, y = state[0]
-    score = 0
-    unvisitedCorners = [corner for corner in corners if corner not in state[1]]
-    
-    while unvisitedCorners:
-        distances = []
-        for corner in unvisitedCorners:
-            distances.append((util.manhattanDistance((x, y), corner), corner))
-        minDist, closestCorner = min(distances)
-        score += minDist
-        x, y = closestCorner
-        unvisitedCorners.remove(closestCorner)
-    
-    return score
+    # The cost of the cheapest order in which to visit the remaining corners,
+    # measured in maze distances, is exactly the cost left to reach the goal.
+    mazeDistance = getMazeDistances(problem).mazeDistance
+    position, visitedCorners = state
+    unvisitedCorners = [corner for corner in corners if not visitedCorners & problem.cornerBits[corner]]
+
+    def cheapestTour(start, remaining):
+        if not remaining: return 0
+        return min(mazeDistance(start, corner) + cheapestTour(corner, [c for c in remaining if c != corner])
+                   for corner in remaining)
+
+    return cheapestTour(position, unvisitedCorners)
 
 class AStarCornersAgent(SearchAgent):
     "A SearchAgent for FoodSearchProblem using A* and your foodHeuristic"
@@ -420,10 +513,13 @@ class FoodSearchProblem:
     A search state in this problem is a tuple ( pacmanPosition, foodGrid ) where
       pacmanPosition: a tuple (x,y) of integers specifying Pacman's position
       foodGrid:       a Grid (see game.py) of either True or False, specifying remaining food
+
+    The food grids of the states are BitGrids, whose copies and hashes are cheap.
     """
     def __init__(self, startingGameState):
-        self.start = (startingGameState.getPacmanPosition(), startingGameState.getFood())
+        self.start = (startingGameState.getPacmanPosition(), startingGameState.getFood().asBitGrid())
         self.walls = startingGameState.getWalls()
+        self.moves = Actions.getLegalMoveTable(self.walls).moves
         self.startingGameState = startingGameState
         self._expanded = 0 # DO NOT CHANGE
         self.heuristicInfo = {} # A dictionary for the heuristic to store information
@@ -438,14 +534,12 @@ class FoodSearchProblem:
         "Returns successor states, the actions they require, and a cost of 1."
         successors = []
         self._expanded += 1 # DO NOT CHANGE
-        for direction in [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST]:
-            x,y = state[0]
-            dx, dy = Actions.directionToVector(direction)
-            nextx, nexty = int(x + dx), int(y + dy)
-            if not self.walls[nextx][nexty]:
-                nextFood = state[1].copy()
+        for direction, (nextx, nexty) in self.moves[state[0]]:
+            nextFood = state[1]
+            if nextFood[nextx][nexty]:
+                nextFood = nextFood.copy()
                 nextFood[nextx][nexty] = False
-                successors.append( ( ((nextx, nexty), nextFood), direction, 1) )
+            successors.append( ( ((nextx, nexty), nextFood), direction, 1) )
         return successors
 
     def getCostOfActions(self, actions):
@@ -502,29 +596,63 @@ def foodHeuristic(state, problem: FoodSearchProblem):
         INSÉREZ VOTRE SOLUTION À LA QUESTION 7 ICI
     '''
 
-    score = 0
+    # Pacman has at least to walk to the farthest remaining food, and to the
+    # nearest one then along a spanning tree of the food. Both bounds are
+    # consistent, so is their max.
     foods = foodGrid.asList()
+    if not foods:
+        return 0
+    mazeDistance = getMazeDistances(problem).mazeDistance
+    farthest = max(mazeDistance(position, food) for food in foods)
+    return max(farthest, mstFoodHeuristic(state, problem))
 
-    unvisitedFoods = foods
-    if not unvisitedFoods:
-        return score
-    
-    closestDist = float('inf')
-    for food in foods:
-        tempDist = util.manhattanDistance(position, food)
-        if tempDist < closestDist:
-            closestDist = tempDist
-    
-    food = foods[0]
-    while foods:
-        nextFood, minDist = foods[0], float('inf')
-        for unvisitedFood in foods:
-            dist = util.manhattanDistance(food, unvisitedFood)
-            if dist < minDist:
-                minDist = dist
-                nextFood = unvisitedFood
-        food = nextFood
-        score += minDist
-        foods.remove(nextFood)
-    return closestDist + score
-    
\ No newline at end of file
+FOOD_MST_CACHE_SIZE = 50000
+
+def foodSpanningTreeCost(foods, mazeDistance):
+    """
+    Returns the weight of a minimum spanning tree of the positions foods,
+    with maze distances as edge weights (Prim's algorithm, O(F^2)).
+    """
+    if not foods: return 0
+    remaining = foods[1:]
+    closest = [mazeDistance(foods[0], food) for food in remaining]
+    total = 0
+    while remaining:
+        i = min(range(len(remaining)), key=closest.__getitem__)
+        total += closest[i]
+        added = remaining[i]
+        remaining[i], closest[i] = remaining[-1], closest[-1]
+        remaining.pop()
+        closest.pop()
+        for j, food in enumerate(remaining):
+            distance = mazeDistance(added, food)
+            if distance < closest[j]:
+                closest[j] = distance
+    return total
+
+def mstFoodHeuristic(state, problem):
+    """
+    The maze distance to the nearest food plus the weight of a minimum
+    spanning tree of the remaining food. Any path eating all the food first
+    reaches one of them, then walks a spanning tree of them, so this is
+    admissible; it is consistent since eating a food f lowers the tree by at
+    most the distance from f to the nearest remaining food.
+
+    The spanning tree only depends on the food, so its weight is memoized by
+    the food bitmask in problem.heuristicInfo['foodMST'], an LRU cache of
+    FOOD_MST_CACHE_SIZE entries.
+    """
+    position, foodGrid = state
+    foods = foodGrid.asList()
+    if not foods:
+        return 0
+    mazeDistance = getMazeDistances(problem).mazeDistance
+    if 'foodMST' not in problem.heuristicInfo:
+        problem.heuristicInfo['foodMST'] = util.LRUCache(FOOD_MST_CACHE_SIZE)
+    cache = problem.heuristicInfo['foodMST']
+    key = foodGrid.asBitGrid().bits
+    treeCost = cache.get(key)
+    if treeCost is None:
+        treeCost = foodSpanningTreeCost(foods, mazeDistance)
+        cache[key] = treeCost
+    return min(mazeDistance(position, food) for food in foods) + treeCost
@@ -0,0 +1,305 @@
+# searchBenchmark.py
+# ------------------
+"""
+Benchmarks for the search code of this project.  Each benchmark prints one
+line per run so that results can be compared between revisions of search.py,
+util.py and searchAgents.py.
+
+> python searchBenchmark.py search
+> python searchBenchmark.py search -l bigMaze,openMaze,contoursMaze -f ucs,bibfs,jps
+> python searchBenchmark.py queue -s 1000,1000000
+> python searchBenchmark.py food -f mstFoodHeuristic -t 60
+> python searchBenchmark.py corners -l bigCorners
+> python searchBenchmark.py successors -l mediumClassic -d 3
+> python searchBenchmark.py grids -l bigSearch,originalClassic
+
+The time per expanded node should stay roughly constant from tinyMaze to
+bigMaze: the search functions scale linearly with the number of expansions.
+"""
+
+import glob
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import layout
+import pacman
+import search
+import searchAgents
+import util
+
+MAZE_LAYOUTS = ['tinyMaze', 'smallMaze', 'mediumMaze', 'bigMaze', 'openMaze', 'contoursMaze']
+SEARCH_FUNCTIONS = ['dfs', 'bfs', 'ucs', 'astar', 'bibfs', 'jps']
+FOOD_HEURISTICS = ['foodHeuristic', 'mstFoodHeuristic']
+SEARCH_TIMEOUT = 30
+CORNERS_LAYOUTS = ['mediumCorners', 'bigCorners']
+SUCCESSOR_LAYOUTS = ['smallClassic', 'mediumClassic', 'originalClassic']
+SUCCESSOR_DEPTH = 3
+GRID_LAYOUTS = ['mediumSearch', 'bigSearch', 'originalClassic']
+GRID_REPEATS = 100
+QUEUE_SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+QUEUE_UPDATES = 100
+
+def loadGameState(layoutName, numGhosts=0):
+    "Returns the initial GameState of a layout, without any ghost by default."
+    lay = layout.getLayout(layoutName)
+    if lay == None: raise Exception("The layout " + layoutName + " cannot be found")
+    gameState = pacman.GameState()
+    gameState.initialize(lay, numGhosts)
+    return gameState
+
+def timeSearch(problem, searchFunction, *args):
+    """
+    Runs searchFunction on problem and returns (actions, expanded, seconds).
+    """
+    start = time.perf_counter()
+    actions = searchFunction(problem, *args)
+    return actions, problem._expanded, time.perf_counter() - start
+
+def splitOption(value, default):
+    "Splits a comma separated command line option, or returns default."
+    return value.split(',') if value else default
+
+def benchmarkSearch(options):
+    "Point to point search on maze layouts with every search function."
+    layoutNames = splitOption(options.layouts, MAZE_LAYOUTS)
+    functionNames = splitOption(options.functions, SEARCH_FUNCTIONS)
+    print('%-14s %-6s %8s %8s %10s %12s' % ('layout', 'fn', 'cost', 'expanded', 'seconds', 'us/expanded'))
+    for layoutName in layoutNames:
+        gameState = loadGameState(layoutName)
+        for fnName in functionNames:
+            problem = searchAgents.PositionSearchProblem(gameState, warn=False, visualize=False)
+            fn = getattr(search, fnName)
+            args = (searchAgents.manhattanHeuristic,) if fnName in ('astar', 'aStarSearch') else ()
+            actions, expanded, seconds = timeSearch(problem, fn, *args)
+            print('%-14s %-6s %8d %8d %10.4f %12.2f' % (layoutName, fnName, problem.getCostOfActions(actions),
+                                                       expanded, seconds, 1e6 * seconds / max(expanded, 1)))
+
+def benchmarkQueue(options):
+    """
+    Push, update (decrease-key) and pop on util.PriorityQueue and
+    util.IndexedPriorityQueue. Only QUEUE_UPDATES updates are timed per size
+    since PriorityQueue.update scans the whole heap.
+    """
+    sizes = [int(size) for size in splitOption(options.sizes, QUEUE_SIZES)]
+    print('%-22s %8s %10s %12s %10s' % ('queue', 'items', 'us/push', 'us/update', 'us/pop'))
+    for size in sizes:
+        rng = random.Random(size)
+        priorities = [rng.random() for _ in range(size)]
+        updated = rng.sample(range(size), min(QUEUE_UPDATES, size))
+        for queueClass in (util.PriorityQueue, util.IndexedPriorityQueue):
+            queue = queueClass()
+            start = time.perf_counter()
+            for item, priority in enumerate(priorities):
+                queue.push(item, priority)
+            pushTime = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for item in updated:
+                queue.update(item, priorities[item] - 1)
+            updateTime = time.perf_counter() - start
+
+            start = time.perf_counter()
+            while not queue.isEmpty():
+                queue.pop()
+            popTime = time.perf_counter() - start
+            print('%-22s %8d %10.3f %12.3f %10.3f' % (queueClass.__name__, size, 1e6 * pushTime / size,
+                                                     1e6 * updateTime / len(updated), 1e6 * popTime / size))
+
+def foodLayouts():
+    "Names of the layouts made for the FoodSearchProblem (layouts/*Search.lay)."
+    return sorted(os.path.basename(path)[:-len('.lay')] for path in glob.glob(os.path.join('layouts', '*Search.lay')))
+
+def benchmarkFood(options):
+    """
+    A* on the FoodSearchProblem of every food layout with each heuristic.
+    Runs longer than the timeout are reported with the expansions done so far.
+    """
+    layoutNames = splitOption(options.layouts, foodLayouts())
+    heuristicNames = splitOption(options.functions, FOOD_HEURISTICS)
+    print('%-18s %-18s %6s %6s %10s %10s' % ('layout', 'heuristic', 'food', 'cost', 'expanded', 'seconds'))
+    for layoutName in layoutNames:
+        gameState = loadGameState(layoutName)
+        for heuristicName in heuristicNames:
+            problem = searchAgents.FoodSearchProblem(gameState)
+            heuristic = getattr(searchAgents, heuristicName)
+            timedSearch = util.TimeoutFunction(timeSearch, options.timeout)
+            start = time.perf_counter()
+            try:
+                actions, expanded, seconds = timedSearch(problem, search.aStarSearch, heuristic)
+                cost = '%6d' % problem.getCostOfActions(actions)
+            except util.TimeoutFunctionException:
+                expanded, seconds, cost = problem._expanded, time.perf_counter() - start, '     -'
+            print('%-18s %-18s %6d %s %10d %10.3f' % (layoutName, heuristicName, gameState.getNumFood(),
+                                                     cost, expanded, seconds))
+
+class FrozensetCornersProblem(searchAgents.CornersProblem):
+    """
+    The CornersProblem with its former states, (position, frozenset of the
+    visited corners), as a baseline for the 4-bit mask states.
+    """
+    def getStartState(self):
+        visited = frozenset([self.startingPosition]) & frozenset(self.corners)
+        return (self.startingPosition, visited)
+
+    def isGoalState(self, state):
+        return len(state[1]) == len(self.corners)
+
+    def getSuccessors(self, state):
+        successors = []
+        (x, y), visitedCorners = state
+        for nextState, action, cost in searchAgents.CornersProblem.getSuccessors(self, ((x, y), 0)):
+            nextPosition = nextState[0]
+            nextVisited = visitedCorners | {nextPosition} if nextPosition in self.corners else visitedCorners
+            successors.append(((nextPosition, nextVisited), action, cost))
+        return successors
+
+def benchmarkCorners(options):
+    """
+    Memory and throughput of the CornersProblem states: bfs and ucs with
+    bitmask states and with the frozenset baseline. The peak memory is
+    measured in a second run, since tracing allocations slows the search.
+    """
+    layoutNames = splitOption(options.layouts, CORNERS_LAYOUTS)
+    functionNames = splitOption(options.functions, ['bfs', 'ucs'])
+    print('%-14s %-6s %-24s %8s %10s %14s %12s' % ('layout', 'fn', 'problem', 'expanded', 'seconds',
+                                                   'expanded/s', 'peak bytes'))
+    for layoutName in layoutNames:
+        gameState = loadGameState(layoutName)
+        for fnName in functionNames:
+            for problemClass in (searchAgents.CornersProblem, FrozensetCornersProblem):
+                actions, expanded, seconds = timeSearch(problemClass(gameState), getattr(search, fnName))
+                tracemalloc.start()
+                timeSearch(problemClass(gameState), getattr(search, fnName))
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print('%-14s %-6s %-24s %8d %10.4f %14.0f %12d' % (layoutName, fnName, problemClass.__name__,
+                                                                   expanded, seconds, expanded / seconds, peak))
+
+def expandGameTree(gameState, depth, agentIndex=0):
+    """
+    Generates every successor of gameState down to depth plies, a ply being
+    one move of each agent, like a minimax agent would. Returns the number of
+    states generated.
+    """
+    if depth == 0 or gameState.isWin() or gameState.isLose():
+        return 0
+    nextAgent = (agentIndex + 1) % gameState.getNumAgents()
+    nextDepth = depth - 1 if nextAgent == 0 else depth
+    generated = 0
+    for action in gameState.getLegalActions(agentIndex):
+        generated += 1 + expandGameTree(gameState.generateSuccessor(agentIndex, action), nextDepth, nextAgent)
+    return generated
+
+def benchmarkSuccessors(options):
+    """
+    GameState.generateSuccessor throughput on a minimax game tree, with and
+    without copy-on-write successors and explored-set tracking. The peak
+    memory is measured in a second run.
+    """
+    layoutNames = splitOption(options.layouts, SUCCESSOR_LAYOUTS)
+    print('%-16s %-12s %-8s %10s %10s %14s %12s' % ('layout', 'copyOnWrite', 'explored', 'states', 'seconds',
+                                                    'states/s', 'peak bytes'))
+    for layoutName in layoutNames:
+        gameState = loadGameState(layoutName, numGhosts=2)
+        for copyOnWrite in (True, False):
+            for trackExplored in (True, False):
+                pacman.GameState.copyOnWrite = copyOnWrite
+                pacman.GameState.trackExplored = trackExplored
+                pacman.GameState.getAndResetExplored()
+                start = time.perf_counter()
+                generated = expandGameTree(gameState, options.depth)
+                seconds = time.perf_counter() - start
+                pacman.GameState.getAndResetExplored()
+                tracemalloc.start()
+                expandGameTree(gameState, options.depth)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                pacman.GameState.getAndResetExplored()
+                print('%-16s %-12s %-8s %10d %10.4f %14.0f %12d' % (layoutName, copyOnWrite, trackExplored,
+                                                                    generated, seconds, generated / seconds, peak))
+    pacman.GameState.copyOnWrite = True
+    pacman.GameState.trackExplored = True
+
+def mazeDistancesFrom(position, walls, targets):
+    "Breadth first search from position, returning the maze distance to each target."
+    from game import Actions
+    neighbors = Actions.getLegalMoveTable(walls).moves
+    distances, layer, distance = {position: 0}, [position], 0
+    while layer:
+        distance += 1
+        nextLayer = []
+        for cell in layer:
+            for _, neighbor in neighbors[cell]:
+                if neighbor not in distances:
+                    distances[neighbor] = distance
+                    nextLayer.append(neighbor)
+        layer = nextLayer
+    return [distances.get(target, -1) for target in targets]
+
+def benchmarkGrids(options):
+    """
+    Food queries on the initial food grid of each layout, in pure Python and
+    with gridArrays.GridArray (which needs NumPy), in microseconds per call.
+    """
+    import gridArrays
+    layoutNames = splitOption(options.layouts, GRID_LAYOUTS)
+    print('%-16s %-22s %12s %12s' % ('layout', 'query', 'python us', 'numpy us'))
+    for layoutName in layoutNames:
+        gameState = loadGameState(layoutName)
+        food, walls, position = gameState.getFood(), gameState.getWalls(), gameState.getPacmanPosition()
+        foodArray = gridArrays.GridArray(food)
+        queries = [
+            ('build GridArray', lambda: None, lambda: gridArrays.GridArray(food)),
+            ('count', food.count, foodArray.count),
+            ('asList', food.asList, foodArray.positions),
+            ('manhattan to all food', lambda: [util.manhattanDistance(position, dot) for dot in food.asList()],
+             lambda: foodArray.manhattanDistances(position)),
+            ('maze to all food', lambda: mazeDistancesFrom(position, walls, food.asList()),
+             lambda: foodArray.mazeDistances(position, walls)),
+        ]
+        for name, python, vectorized in queries:
+            times = []
+            for function in (python, vectorized):
+                start = time.perf_counter()
+                for _ in range(GRID_REPEATS):
+                    function()
+                times.append(1e6 * (time.perf_counter() - start) / GRID_REPEATS)
+            print('%-16s %-22s %12.1f %12.1f' % (layoutName, name, times[0], times[1]))
+
+BENCHMARKS = {
+    'search': benchmarkSearch,
+    'queue': benchmarkQueue,
+    'food': benchmarkFood,
+    'corners': benchmarkCorners,
+    'successors': benchmarkSuccessors,
+    'grids': benchmarkGrids,
+}
+
+def readCommand(argv):
+    from optparse import OptionParser
+    usageStr = """
+    USAGE:      python searchBenchmark.py <benchmark> <options>
+    BENCHMARKS: %s
+    """ % ', '.join(BENCHMARKS)
+    parser = OptionParser(usageStr)
+    parser.add_option('-l', '--layouts', dest='layouts',
+                      help='Comma separated layouts to run on', default=None)
+    parser.add_option('-f', '--functions', dest='functions',
+                      help='Comma separated search functions (or heuristics) to run', default=None)
+    parser.add_option('-s', '--sizes', dest='sizes',
+                      help='Comma separated queue sizes to run', default=None)
+    parser.add_option('-t', '--timeout', dest='timeout', type='int',
+                      help='Seconds allowed to each search [Default: %default]', default=SEARCH_TIMEOUT)
+    parser.add_option('-d', '--depth', dest='depth', type='int',
+                      help='Plies of the game trees to expand [Default: %default]', default=SUCCESSOR_DEPTH)
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 1 or otherjunk[0] not in BENCHMARKS:
+        parser.error('Choose one benchmark among: ' + ', '.join(BENCHMARKS))
+    return otherjunk[0], options
+
+if __name__ == '__main__':
+    name, options = readCommand(sys.argv[1:])
+    BENCHMARKS[name](options)
@@ -29,6 +29,7 @@
 import sys
 import inspect
 import heapq, random
+from collections import deque, OrderedDict
 
 
 class FixedRandom:
@@ -147,14 +148,17 @@ class Stack:
         "Returns true if the stack is empty"
         return len(self.list) == 0
 
+    def __len__(self):
+        return len(self.list)
+
 class Queue:
     "A container with a first-in-first-out (FIFO) queuing policy."
     def __init__(self):
-        self.list = []
+        self.list = deque()
 
     def push(self,item):
         "Enqueue the 'item' into the queue"
-        self.list.insert(0,item)
+        self.list.appendleft(item)
 
     def pop(self):
         """
@@ -167,6 +171,9 @@ class Queue:
         "Returns true if the queue is empty"
         return len(self.list) == 0
 
+    def __len__(self):
+        return len(self.list)
+
 class PriorityQueue:
     """
       Implements a priority queue data structure. Each inserted item
@@ -190,6 +197,9 @@ class PriorityQueue:
     def isEmpty(self):
         return len(self.heap) == 0
 
+    def __len__(self):
+        return len(self.heap)
+
     def update(self, item, priority):
         # If item already in priority queue with higher priority, update its priority and rebuild the heap.
         # If item already in priority queue with equal or lower priority, do nothing.
@@ -205,6 +215,138 @@ class PriorityQueue:
         else:
             self.push(item, priority)
 
+class IndexedPriorityQueue:
+    """
+      Implements a priority queue of distinct, hashable items as a binary
+      heap together with a map from each item to its slot in the heap.
+      Finding an item never scans the heap, so update and remove run in
+      O(log n) and membership tests in O(1). As with PriorityQueue, items
+      of equal priority are popped in insertion order.
+    """
+    def  __init__(self):
+        self.heap = []
+        self.index = {}
+        self.count = 0
+
+    def push(self, item, priority):
+        # If item is already in the queue, its priority is replaced.
+        if item in self.index:
+            self._reprioritize(item, priority)
+            return
+        self.heap.append((priority, self.count, item))
+        self.count += 1
+        self._siftUp(len(self.heap) - 1)
+
+    def pop(self):
+        heap = self.heap
+        last = heap.pop()
+        if heap:
+            top = heap[0]
+            heap[0] = last
+            self._siftDown(0)
+        else:
+            top = last
+        del self.index[top[2]]
+        return top[2]
+
+    def isEmpty(self):
+        return len(self.heap) == 0
+
+    def update(self, item, priority):
+        # Same contract as PriorityQueue.update: only ever lowers the priority
+        # of an item already in the queue, and pushes items that are not.
+        if item not in self.index:
+            self.push(item, priority)
+        elif priority < self.heap[self.index[item]][0]:
+            self._reprioritize(item, priority)
+
+    def remove(self, item):
+        "Removes item from the queue; raises KeyError if it is not in it."
+        pos = self.index.pop(item)
+        last = self.heap.pop()
+        if pos < len(self.heap):
+            self.heap[pos] = last
+            self._siftUp(pos)
+            self._siftDown(self.index[last[2]])
+
+    def getPriority(self, item):
+        return self.heap[self.index[item]][0]
+
+    def __contains__(self, item):
+        return item in self.index
+
+    def __len__(self):
+        return len(self.heap)
+
+    def _reprioritize(self, item, priority):
+        pos = self.index[item]
+        oldPriority, count, _ = self.heap[pos]
+        self.heap[pos] = (priority, count, item)
+        if priority < oldPriority:
+            self._siftUp(pos)
+        else:
+            self._siftDown(pos)
+
+    def _siftUp(self, pos):
+        heap, index = self.heap, self.index
+        entry = heap[pos]
+        while pos > 0:
+            parentPos = (pos - 1) >> 1
+            parent = heap[parentPos]
+            if not entry < parent:
+                break
+            heap[pos] = parent
+            index[parent[2]] = pos
+            pos = parentPos
+        heap[pos] = entry
+        index[entry[2]] = pos
+
+    def _siftDown(self, pos):
+        heap, index = self.heap, self.index
+        size = len(heap)
+        entry = heap[pos]
+        child = 2 * pos + 1
+        while child < size:
+            if child + 1 < size and heap[child + 1] < heap[child]:
+                child += 1
+            if not heap[child] < entry:
+                break
+            heap[pos] = heap[child]
+            index[heap[pos][2]] = pos
+            pos = child
+            child = 2 * pos + 1
+        heap[pos] = entry
+        index[entry[2]] = pos
+
+class LRUCache:
+    """
+      A mapping holding at most maxSize entries. When it is full, storing a
+      new key evicts the least recently stored or read entry.
+    """
+    def __init__(self, maxSize):
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+
+    def get(self, key, default=None):
+        entries = self.entries
+        if key not in entries:
+            return default
+        entries.move_to_end(key)
+        return entries[key]
+
+    def __setitem__(self, key, value):
+        entries = self.entries
+        entries[key] = value
+        entries.move_to_end(key)
+        if len(entries) > self.maxSize:
+            entries.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
 def manhattanDistance( xy1, xy2 ):
     "Returns the Manhattan distance between points xy1 and xy2"
     return abs( xy1[0] - xy2[0] ) + abs( xy1[1] - xy2[1] )
@@ -0,0 +1,292 @@
+from __future__ import annotations
+import random
+from typing import Dict, List, Optional, Tuple
+
+from board_divercite import CELLS_OF_TYPE, DIM, NEIGHBOURS, POSITIONS
+from seahorse.game.game_layout.board import Piece
+
+COLORS = "RGBY"
+CELL_TYPES = "CR"
+PIECES = [color+res_city for color in COLORS for res_city in CELL_TYPES]
+PIECE_INDEX = {piece: index for index, piece in enumerate(PIECES)}
+COLOR_INDEX = {color: index for index, color in enumerate(COLORS)}
+
+# A cell holds 0 when empty, else 1 + player*len(PIECES) + piece index, player being 0 or 1
+CODE_PLAYER = [None] + [code // len(PIECES) for code in range(2 * len(PIECES))]
+CODE_COLOR = [None] + [PIECE_INDEX[PIECES[code % len(PIECES)]] // 2 for code in range(2 * len(PIECES))]
+
+# The free cells of each type are a bitmask, bit i standing for the i-th cell of CELLS_OF_TYPE. The piece of
+# index p goes on cells of type CELL_TYPES[p % 2].
+FREE_BIT = [0] * (DIM * DIM)
+for _cell_type in CELL_TYPES:
+    for _index, _cell in enumerate(CELLS_OF_TYPE[_cell_type]):
+        FREE_BIT[_cell] = 1 << _index
+# The cells of each byte value of the bitmasks, byte k of the mask of type t at FREE_CELLS_OF_BYTE[t][k][byte]
+FREE_CELLS_OF_BYTE = [[tuple(tuple(cells[8*k + bit] for bit in range(min(8, len(cells) - 8*k)) if byte >> bit & 1)
+                             for byte in range(256))
+                       for k in range((len(cells) + 7) // 8)]
+                      for cells in (CELLS_OF_TYPE[cell_type] for cell_type in CELL_TYPES)]
+
+# The Piece of each code, by players: pieces are never modified, so boards share them
+_PIECES_BY_CODE = {}
+
+# Zobrist keys: one 64-bit random number per (code, cell), for the second player to move and per score
+_ZOBRIST_RANDOM = random.Random(0)
+PIECE_KEYS = [[0] * (DIM * DIM)] + [[_ZOBRIST_RANDOM.getrandbits(64) for _ in range(DIM * DIM)]
+                                    for _ in range(2 * len(PIECES))]
+SIDE_KEY = _ZOBRIST_RANDOM.getrandbits(64)
+_SCORE_KEYS = {}
+
+
+def score_key(player: int, score: int) -> int:
+    """
+    Return the Zobrist key of player having score, drawn the first time it is asked for.
+    """
+    key = _SCORE_KEYS.get((player, score))
+    if key is None:
+        key = _SCORE_KEYS[(player, score)] = _ZOBRIST_RANDOM.getrandbits(64)
+    return key
+
+
+class ArrayBoardDivercite:
+    """
+    A compact, mutable representation of a Divercite game: the 81 cells and the pieces left in bytearrays,
+    the scores in a list. Moves are played in place with make and taken back with unmake, so that a search
+    does not build a new state for every node. GameStateDivercite is a view over it.
+
+    Attributes:
+        players_ids (Tuple[int, int]): The IDs of the two players, in playing order.
+        piece_types (Tuple[str, str]): The piece types ("W" or "B") of the two players.
+        cells (bytearray): The code of the piece on each cell, 0 if the cell is empty.
+        pieces_left (bytearray): The number of pieces of each type left, at player*len(PIECES) + piece index.
+        scores (List[int]): The scores of the two players.
+        step (int): The number of moves played.
+        next_index (int): The index (0 or 1) of the next player to play.
+        max_step (int): The number of moves of a game.
+        key (int): The Zobrist key of the pieces on the board and of the next player, kept up to date by make
+            and unmake.
+        free_masks (List[int]): The bitmasks (see FREE_BIT) of the empty cells of each type of CELL_TYPES, kept
+            up to date by make and unmake.
+    """
+
+    def __init__(self, players_ids: Tuple[int, int], piece_types: Tuple[str, str], cells: bytearray,
+                 pieces_left: bytearray, scores: List[int], step: int, next_index: int, max_step: int = 40,
+                 key: Optional[int] = None, free_masks: Optional[List[int]] = None) -> None:
+        self.players_ids = players_ids
+        self.piece_types = piece_types
+        self.cells = cells
+        self.pieces_left = pieces_left
+        self.scores = scores
+        self.step = step
+        self.next_index = next_index
+        self.max_step = max_step
+        if key is None:
+            key = SIDE_KEY if next_index else 0
+            for cell, code in enumerate(cells):
+                key ^= PIECE_KEYS[code][cell]
+        self.key = key
+        if free_masks is None:
+            free_masks = [sum(FREE_BIT[cell] for cell in CELLS_OF_TYPE[cell_type] if not cells[cell])
+                          for cell_type in CELL_TYPES]
+        self.free_masks = free_masks
+
+    @classmethod
+    def from_state(cls, state) -> ArrayBoardDivercite:
+        """
+        Build the array representation of a GameStateDivercite.
+
+        Args:
+            state (GameStateDivercite): The state to convert.
+
+        Returns:
+            ArrayBoardDivercite: A new board holding the same game.
+        """
+        players_ids = tuple(player.get_id() for player in state.players)
+        cells = bytearray(DIM * DIM)
+        for (i, j), piece in state.get_rep().get_env().items():
+            player = players_ids.index(piece.get_owner_id())
+            cells[i*DIM + j] = 1 + player*len(PIECES) + PIECE_INDEX[piece.get_type()[:2]]
+        pieces_left = bytearray(2 * len(PIECES))
+        for player, player_id in enumerate(players_ids):
+            for piece, n_piece in state.players_pieces_left[player_id].items():
+                pieces_left[player*len(PIECES) + PIECE_INDEX[piece]] = n_piece
+        return cls(players_ids, tuple(player.get_piece_type() for player in state.players), cells, pieces_left,
+                   [state.scores[player_id] for player_id in players_ids], state.step,
+                   players_ids.index(state.next_player.get_id()), state.max_step)
+
+    def copy(self) -> ArrayBoardDivercite:
+        return ArrayBoardDivercite(self.players_ids, self.piece_types, self.cells[:], self.pieces_left[:],
+                                   self.scores[:], self.step, self.next_index, self.max_step, self.key,
+                                   self.free_masks[:])
+
+    def is_done(self) -> bool:
+        return self.step == self.max_step
+
+    def zobrist_key(self) -> int:
+        """
+        Return the 64-bit Zobrist key of the game: the pieces on the board, the next player and the scores.
+        The pieces left and the step follow from the pieces on the board.
+        """
+        return self.key ^ score_key(0, self.scores[0]) ^ score_key(1, self.scores[1])
+
+    def possible_moves(self) -> List[Tuple[int, int]]:
+        """
+        List the moves of the next player, by piece then by cell. The free cells are read from free_masks a
+        byte at a time, so that the cost follows the number of moves rather than the size of the board.
+
+        Returns:
+            List[Tuple[int, int]]: The (cell, piece index) of each legal move.
+        """
+        free_cells = self.free_cells()
+        offset = self.next_index * len(PIECES)
+        return [(cell, piece) for piece in range(len(PIECES)) if self.pieces_left[offset + piece] > 0
+                for cell in free_cells[piece % 2]]
+
+    def free_cells(self) -> Tuple[Tuple[int, ...], Tuple[int, ...]]:
+        """
+        Return the empty cells of each type of CELL_TYPES, in increasing order.
+        """
+        # 16 cities and 25 resources: 2 and 4 bytes
+        cities, resources = self.free_masks
+        city_bytes, resource_bytes = FREE_CELLS_OF_BYTE
+        return (city_bytes[0][cities & 255] + city_bytes[1][cities >> 8],
+                resource_bytes[0][resources & 255] + resource_bytes[1][resources >> 8 & 255]
+                + resource_bytes[2][resources >> 16 & 255] + resource_bytes[3][resources >> 24])
+
+    def make(self, cell: int, piece: int) -> Tuple[int, int, int, int, int]:
+        """
+        Play piece for the next player on cell, in place, updating the scores as compute_scores does.
+
+        Args:
+            cell (int): The cell to play on.
+            piece (int): The index of the piece in PIECES.
+
+        Returns:
+            Tuple: What unmake needs to take the move back.
+        """
+        player = self.next_index
+        undo = (cell, piece, player, self.scores)
+        self.scores = self.scores_after(cell, piece, player)
+        code = 1 + player*len(PIECES) + piece
+        self.cells[cell] = code
+        self.free_masks[piece % 2] ^= FREE_BIT[cell]
+        self.key ^= PIECE_KEYS[code][cell] ^ SIDE_KEY
+        self.pieces_left[player*len(PIECES) + piece] -= 1
+        self.step += 1
+        self.next_index = 1 - player
+        return undo
+
+    def unmake(self, undo: Tuple[int, int, int, List[int]]) -> None:
+        """
+        Take back the move that returned undo, which must be the last move played.
+        """
+        cell, piece, player, scores = undo
+        self.key ^= PIECE_KEYS[self.cells[cell]][cell] ^ SIDE_KEY
+        self.cells[cell] = 0
+        self.free_masks[piece % 2] ^= FREE_BIT[cell]
+        self.pieces_left[player*len(PIECES) + piece] += 1
+        self.scores = scores
+        self.step -= 1
+        self.next_index = player
+
+    def scores_after(self, cell: int, piece: int, player: int) -> List[int]:
+        """
+        Compute the scores after player plays piece on cell, as compute_scores does, without playing it.
+
+        Args:
+            cell (int): The cell to play on, which must be empty.
+            piece (int): The index of the piece in PIECES.
+            player (int): The index (0 or 1) of the player.
+
+        Returns:
+            List[int]: The new scores of the two players.
+        """
+        scores = self.scores[:]
+        self._score_move(scores, cell, piece, player)
+        if self.step == self.max_step-1 and scores[0] == scores[1]:
+            # Last step, we prevent draws
+            self.cells[cell] = 1 + player*len(PIECES) + piece
+            self._remove_draw(scores)
+            self.cells[cell] = 0
+        return scores
+
+    def _score_move(self, scores: List[int], cell: int, piece: int, player: int) -> None:
+        """
+        Add to scores the points of playing piece on cell, the piece not being on the board yet.
+        """
+        cells = self.cells
+        color = piece // 2
+        if PIECES[piece][1] == "C":
+            colors = [CODE_COLOR[cells[n]] for n in NEIGHBOURS[cell] if cells[n]]
+            if len(set(colors)) == 4:
+                scores[player] += 5
+            else:
+                scores[player] += colors.count(color)
+        else:
+            for n in NEIGHBOURS[cell]:
+                code = cells[n]
+                if code:
+                    owner = CODE_PLAYER[code]
+                    colors = {CODE_COLOR[cells[m]] for m in NEIGHBOURS[n] if cells[m]}
+                    colors.add(color)
+                    if len(colors) == 4:
+                        scores[owner] += 5 - int(CODE_COLOR[code] != color)
+                    else:
+                        scores[owner] += int(CODE_COLOR[code] == color)
+
+    def _remove_draw(self, scores: List[int]) -> None:
+        """
+        Break a draw at the end of the game as GameStateDivercite.remove_draw does: by the number of
+        divercites, then of cities surrounded by 4, 3 and 2 resources of their colour, then in favour of the
+        first player.
+        """
+        divercites = [self.count_divercite(0), self.count_divercite(1)]
+        scores[0] += divercites[0] > divercites[1]
+        scores[1] += divercites[1] > divercites[0]
+        stack = 4
+        while scores[0] == scores[1]:
+            stacks = [self.count_nstack(0, stack), self.count_nstack(1, stack)]
+            scores[0] += stacks[0] > stacks[1]
+            scores[1] += stacks[1] > stacks[0]
+            if stack == 2:
+                scores[0] += 1
+                break
+            stack -= 1
+
+    def _cities(self, player: int) -> List[int]:
+        cells = self.cells
+        return [cell for cell in CELLS_OF_TYPE["C"] if cells[cell] and CODE_PLAYER[cells[cell]] == player]
+
+    def count_divercite(self, player: int) -> int:
+        """
+        Count the cities of player surrounded by resources of the 4 colours.
+        """
+        cells = self.cells
+        return sum(len({CODE_COLOR[cells[n]] for n in NEIGHBOURS[cell] if cells[n]}) == 4
+                   for cell in self._cities(player))
+
+    def count_nstack(self, player: int, n: int) -> int:
+        """
+        Count the cities of player surrounded by exactly n resources of their colour.
+        """
+        cells = self.cells
+        return sum(sum(CODE_COLOR[cells[m]] == CODE_COLOR[cells[cell]] for m in NEIGHBOURS[cell] if cells[m]) == n
+                   for cell in self._cities(player))
+
+    def get_scores(self) -> Dict[int, int]:
+        return {self.players_ids[0]: self.scores[0], self.players_ids[1]: self.scores[1]}
+
+    def get_players_pieces_left(self) -> Dict[int, Dict[str, int]]:
+        return {player_id: {piece: self.pieces_left[player*len(PIECES) + index] for index, piece in enumerate(PIECES)}
+                for player, player_id in enumerate(self.players_ids)}
+
+    def get_env(self) -> Dict[Tuple[int, int], Piece]:
+        """
+        Build the environment dictionary of a BoardDivercite holding the pieces of this board.
+        """
+        pieces = _PIECES_BY_CODE.get((self.players_ids, self.piece_types))
+        if pieces is None:
+            pieces = _PIECES_BY_CODE[(self.players_ids, self.piece_types)] = [None] + [
+                Piece(piece_type=PIECES[code % len(PIECES)] + self.piece_types[code // len(PIECES)],
+                      owner_id=self.players_ids[code // len(PIECES)]) for code in range(2 * len(PIECES))]
+        return {POSITIONS[cell]: pieces[code] for cell, code in enumerate(self.cells) if code}
@@ -0,0 +1,112 @@
+import argparse
+import random
+import time
+
+from array_board_divercite import ArrayBoardDivercite
+from game_state_divercite import GameStateDivercite
+from board_divercite import BoardDivercite
+from player_divercite import PlayerDivercite
+from my_player import MyPlayer, TranspositionTable
+
+
+def initial_state(player1: PlayerDivercite, player2: PlayerDivercite) -> GameStateDivercite:
+    """
+    Build the initial state of a game between player1 and player2, as main_divercite.play does.
+    """
+    players = [player1, player2]
+    players_pieces_left = {player.get_id(): {c+t: (3 if t == "R" else 2) for c in ["R","G","B","Y"] for t in ["C","R"]}
+                           for player in players}
+    return GameStateDivercite(scores={player.get_id(): 0 for player in players}, next_player=player1, players=players,
+                              rep=BoardDivercite(env={}, dim=[9, 9]), step=0, players_pieces_left=players_pieces_left)
+
+
+def random_position(state: GameStateDivercite, n_moves: int, seed: int) -> GameStateDivercite:
+    """
+    Play n_moves random moves from state.
+    """
+    rng = random.Random(seed)
+    for _ in range(n_moves):
+        actions = sorted(state.generate_possible_light_actions(), key=lambda a: (a.data["position"], a.data["piece"]))
+        state = state.apply_action(rng.choice(actions))
+    return state
+
+
+def perft(state: GameStateDivercite, depth: int) -> int:
+    """
+    Count the positions reached in depth moves through apply_action.
+    """
+    if depth == 0 or state.is_done():
+        return 1
+    return sum(perft(state.apply_action(action), depth - 1) for action in state.generate_possible_light_actions())
+
+
+def perft_array(board: ArrayBoardDivercite, depth: int) -> int:
+    """
+    Count the positions reached in depth moves, playing them in place with make and unmake.
+    """
+    if depth == 0 or board.is_done():
+        return 1
+    nodes = 0
+    for cell, piece in board.possible_moves():
+        undo = board.make(cell, piece)
+        nodes += perft_array(board, depth - 1)
+        board.unmake(undo)
+    return nodes
+
+
+class CountingPlayer(MyPlayer):
+    """
+    MyPlayer counting the nodes visited by its minimax search, the late-phase leaves evaluated from their
+    score delta without a _minimax call included.
+    """
+
+    def __init__(self, piece_type: str, name: str = "Counting"):
+        super().__init__(piece_type, name)
+        self.nodes = 0
+
+    def _minimax(self, state, depth, alpha, beta, maximizing):
+        self.nodes += 1
+        return super()._minimax(state, depth, alpha, beta, maximizing)
+
+    def _evaluate_late_action(self, state, action):
+        self.nodes += 1
+        return super()._evaluate_late_action(state, action)
+
+
+def benchmark(name: str, function, repeat: int) -> None:
+    best, count = None, 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<40} {count:>9} nodes {best * 1000:>10.1f} ms {count / best:>12.0f} nodes/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="benchmark_divercite.py",
+                                     description="Measures the node throughput of move generation and of the minimax player.")
+    parser.add_argument("-m", "--moves", type=int, nargs="*", default=[4, 14, 24],
+                        help="Number of random moves played before each benchmarked position.")
+    parser.add_argument("-d", "--depth", type=int, default=2, help="Depth of the perft and minimax searches.")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Number of runs kept the best of.")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="Seed of the random moves.")
+    args = parser.parse_args()
+
+    for n_moves in args.moves:
+        player, opponent = CountingPlayer("W"), PlayerDivercite("B", name="opponent")
+        player.id, opponent.id = 1, 2
+        state = random_position(initial_state(player, opponent), n_moves, args.seed)
+        print(f"Position after {n_moves} moves, depth {args.depth}:")
+
+        benchmark("perft (apply_action)", lambda: perft(state, args.depth), args.repeat)
+        benchmark("perft (make/unmake)", lambda: perft_array(state.get_array_board().copy(), args.depth), args.repeat)
+
+        def search():
+            player.nodes = 0
+            player._transposition_table = TranspositionTable()
+            player._timeout = float("inf")
+            player._number_of_remaining_moves = 20 - state.get_step() // 2
+            player._minimax(state, args.depth, float("-inf"), float("inf"), maximizing=True)
+            return player.nodes
+        benchmark("minimax (MyPlayer)", search, args.repeat)
@@ -117,6 +117,9 @@ class BoardDivercite(Board):
         Returns:
             Dict[str,Tuple[str,Tuple[int,int]]]: dictionnary of the neighbours of the cell (i,j)
         """
+        if 0 <= i < DIM and 0 <= j < DIM:
+            env = self.env
+            return {name: (env.get(pos, "EMPTY") if inside else "OUTSIDE", pos) for name, pos, inside in NEIGHBOUR_ENTRIES[i*DIM + j]}
         neighbours = {"top_right":(i-1, j), "top_left":(i,j-1), "bot_left":(i, j+1), "bot_right":(i+1,j)}
         for k,v in neighbours.items():
             if v not in self.env.keys():
@@ -219,3 +222,20 @@ class BoardDivercite(Board):
             del dd["env"][x]
             dd["env"][eval(x)] = Piece.from_json(json.dumps(y))
         return cls(**dd)
+
+
+# Static tables of the board, computed once. Cell (i, j) is the index i*DIM + j.
+DIM = 9
+POSITIONS = [(cell // DIM, cell % DIM) for cell in range(DIM * DIM)]
+IN_BOARD = [not BoardDivercite.FORBIDDEN_MASK[i][j] for i, j in POSITIONS]
+CELL_TYPE = [BoardDivercite.BOARD_MASK[i][j] or None for i, j in POSITIONS]
+CITY_CELLS = [cell for cell in range(DIM * DIM) if CELL_TYPE[cell] == "C"]
+RESOURCE_CELLS = [cell for cell in range(DIM * DIM) if CELL_TYPE[cell] == "R"]
+CELLS_OF_TYPE = {"C": CITY_CELLS, "R": RESOURCE_CELLS}
+# (name, position, in board) of the 4 neighbours of each cell, in the order of get_neighbours
+NEIGHBOUR_ENTRIES = [tuple((name, (i+di, j+dj), 0 <= i+di < DIM and 0 <= j+dj < DIM and IN_BOARD[(i+di)*DIM + j+dj])
+                           for name, (di, dj) in (("top_right", (-1, 0)), ("top_left", (0, -1)),
+                                                  ("bot_left", (0, 1)), ("bot_right", (1, 0))))
+                     for i, j in POSITIONS]
+# The cells of the neighbours in the board of each cell
+NEIGHBOURS = [tuple(pos[0]*DIM + pos[1] for _, pos, inside in entries if inside) for entries in NEIGHBOUR_ENTRIES]
@@ -1,11 +1,11 @@
-import copy
 import json
 import random
-from typing import Dict, Generator, List, Optional, Set, Tuple
+from functools import cached_property
+from typing import Dict, Generator, List, Optional, Tuple
 
-from board_divercite import BoardDivercite
+from array_board_divercite import CODE_COLOR, COLOR_INDEX, PIECE_INDEX, PIECES, ArrayBoardDivercite
+from board_divercite import CITY_CELLS, DIM, IN_BOARD, NEIGHBOURS, POSITIONS, BoardDivercite
 from player_divercite import PlayerDivercite
-from seahorse.game.game_layout.board import Piece
 from seahorse.game.game_state import GameState
 from seahorse.game.heavy_action import HeavyAction
 from seahorse.game.light_action import LightAction
@@ -21,14 +21,72 @@ class GameStateDivercite(GameState):
         next_player (Player): Next player to play.
         players (list[Player]): List of players.
         rep (Representation): Representation of the game.
+
+    The states built by apply_action are views over an ArrayBoardDivercite: their rep and players_pieces_left
+    are only built when they are asked for. A state must not be modified once built.
     """
     def __init__(self, scores: Dict, next_player: Player, players: List[Player], rep: BoardDivercite, step: int, 
                  players_pieces_left: dict[str: dict[str: int]],  *args, **kwargs) -> None:
+        self._array_board = None
         super().__init__(scores, next_player, players, rep)
         self.max_step = 40
         self.step = step
         self.players_pieces_left = {int(a):b for a,b in players_pieces_left.items()}
 
+    @classmethod
+    def from_array_board(cls, board: ArrayBoardDivercite, players: List[Player]) -> "GameStateDivercite":
+        """
+        Build a state viewing board, which the state then owns and which must not be modified.
+
+        Args:
+            board (ArrayBoardDivercite): The board of the state.
+            players (List[Player]): The players, in the order of board.players_ids.
+
+        Returns:
+            GameStateDivercite: The state of board.
+        """
+        state = cls.__new__(cls)
+        state.scores = board.get_scores()
+        state.next_player = players[board.next_index]
+        state.players = players
+        state._array_board = board
+        state._possible_light_actions = None
+        state._possible_heavy_actions = None
+        state.max_step = board.max_step
+        state.step = board.step
+        return state
+
+    @cached_property
+    def rep(self) -> BoardDivercite:
+        # Only reached by the states of from_array_board, __init__ sets rep
+        return BoardDivercite(env=self._array_board.get_env(), dim=[DIM, DIM])
+
+    @cached_property
+    def players_pieces_left(self) -> dict[int: dict[str: int]]:
+        return self._array_board.get_players_pieces_left()
+
+    def get_zobrist_key(self) -> int:
+        """
+        Return the Zobrist key of the state, updated incrementally by each move: equal states have equal keys,
+        and different states almost surely different ones.
+
+        Returns:
+            int: The 64-bit key of the pieces on the board, the next player and the scores.
+        """
+        return self.get_array_board().zobrist_key()
+
+    def get_array_board(self) -> ArrayBoardDivercite:
+        """
+        Return the array representation of the state, built on first use. It is shared by the state and must
+        not be modified: search copies it once and then plays on the copy with make and unmake.
+
+        Returns:
+            ArrayBoardDivercite: The board of the state.
+        """
+        if self._array_board is None:
+            self._array_board = ArrayBoardDivercite.from_state(self)
+        return self._array_board
+
     def get_step(self) -> int:
         """
         Return the current step of the game.
@@ -60,7 +118,7 @@ class GameStateDivercite(GameState):
         Returns:
             bool: True if the index is within the game board, False otherwise.
         """
-        return not BoardDivercite.FORBIDDEN_MASK[index[0]][index[1]]
+        return IN_BOARD[index[0]*DIM + index[1]]
     
     def piece_type_match(self, resource_or_city: str, pos: tuple) -> bool:
         """
@@ -97,32 +155,9 @@ class GameStateDivercite(GameState):
         Returns:
             Generator[HeavyAction]: Generator of possible heavy actions.
         """
-        current_rep = self.get_rep()
-        b = current_rep.get_env()
-        d = current_rep.get_dimensions()
-
-        for piece, n_piece in self.players_pieces_left[self.next_player.get_id()].items():
-            piece_color = piece[0]
-            piece_res_city = piece[1]
-            if n_piece > 0:
-                for i in range(d[0]):
-                    for j in range(d[1]):
-                        if self.in_board((i, j)) and (i,j) not in b and self.piece_type_match(piece_res_city, (i, j)):
-                            copy_b = copy.copy(b)
-                            copy_b[(i, j)] = Piece(piece_type=piece_color+piece_res_city+self.next_player.piece_type, owner=self.next_player)
-                            play_info = ((i,j), piece, self.next_player.get_id())
-                            yield HeavyAction(
-                                            self,
-                                            GameStateDivercite(
-                                                self.compute_scores(play_info),
-                                                self.compute_next_player(),
-                                                self.players,
-                                                BoardDivercite(env=copy_b, dim=d),
-                                                step=self.step + 1,
-                                                players_pieces_left=self.compute_players_pieces_left(play_info),
-                                            ),
-                                        )
-                            
+        for action in self.generate_possible_light_actions():
+            yield HeavyAction(self, self.apply_action(action))
+
 
     def generate_possible_light_actions(self) -> Generator[LightAction, None, None]:
         """
@@ -132,19 +167,8 @@ class GameStateDivercite(GameState):
             Generator[LightAction]: Generator of possible light actions.
 
         """
-
-        current_rep = self.get_rep()
-        b = current_rep.get_env()
-        d = current_rep.get_dimensions()
-        for piece, n_piece in self.players_pieces_left[self.next_player.get_id()].items():
-            piece_color = piece[0]
-            piece_res_city = piece[1]
-            if n_piece > 0:
-                for i in range(d[0]):
-                    for j in range(d[1]):
-                        if self.in_board((i, j)) and (i,j) not in b and self.piece_type_match(piece_res_city, (i, j)):
-                            data = {"piece": piece_color+piece_res_city, "position" : (i,j)}
-                            yield LightAction(data)
+        for cell, piece in self.get_array_board().possible_moves():
+            yield LightAction({"piece": PIECES[piece], "position": POSITIONS[cell]})
 
 
     def apply_action(self, action: LightAction) -> GameState:
@@ -162,23 +186,10 @@ class GameStateDivercite(GameState):
             raise ValueError("The action must be a LightAction.")
         
         piece, position = action.data["piece"], action.data["position"]
-        
-        current_rep = self.get_rep()
-        b = current_rep.get_env()
-        d = current_rep.get_dimensions()
-        copy_b = copy.copy(b)
-        copy_b[position] = Piece(piece_type=piece+self.next_player.get_piece_type(), owner=self.next_player)
-        new_board = BoardDivercite(env=copy_b, dim=d)
-        play_info = (position, piece, self.next_player.get_id())
-
-        return GameStateDivercite(
-            self.compute_scores(play_info=play_info),
-            self.compute_next_player(),
-            self.players,
-            new_board,
-            step=self.step + 1,
-            players_pieces_left=self.compute_players_pieces_left(play_info=play_info),
-        )
+
+        board = self.get_array_board().copy()
+        board.make(position[0]*DIM + position[1], PIECE_INDEX[piece])
+        return GameStateDivercite.from_array_board(board, self.players)
 
     def convert_gui_data_to_action_data(self, gui_data: dict) -> dict:
         """
@@ -203,7 +214,7 @@ class GameStateDivercite(GameState):
             dict[str: dict[str: int]]: A dictionary with player ID as the key and score as the value.
         """
         pos, piece, id_player = play_info
-        players_pieces_left = copy.deepcopy(self.players_pieces_left)
+        players_pieces_left = {player_id: dict(pieces) for player_id, pieces in self.players_pieces_left.items()}
         players_pieces_left[id_player][piece] -= 1
         return players_pieces_left
     
@@ -218,35 +229,26 @@ class GameStateDivercite(GameState):
             dict[int, float]: A dictionary with player ID as the key and score as the value.
         """
         pos, piece, id_player = play_info
-        color, res_city = piece[0], piece[1]
-        scores = copy.copy(self.scores)
-        if res_city == "C":
-            if self.check_divercite(pos):
-                scores[id_player] += 5
-            else:
-                scores[id_player] += len([n for n in self.get_neighbours(pos[0], pos[1]).values() 
-                                          if isinstance(n[0], Piece) and n[0].get_type()[0] == color])
-        else:            
-            for n in self.get_neighbours(pos[0], pos[1]).values():
-                if isinstance(n[0], Piece):
-                    if self.check_divercite(n[1], color):
-                        scores[n[0].get_owner_id()] -= int(n[0].get_type()[0] != color)
-                        scores[n[0].get_owner_id()] += 5
-                    else:
-                        scores[n[0].get_owner_id()] += int(n[0].get_type()[0] == color)
-
-        if self.step == self.max_step-1:
-            # Last step, we prevent draws
-            player1, player2 = self.players
-            if scores[player1.get_id()] == scores[player2.get_id()]:
-                
-                env = copy.copy(self.get_rep().get_env())
-                player = self.get_player_id(id_player)
-                env[pos] = Piece(piece_type=color+res_city+player.piece_type, owner=player)
-                new_board = BoardDivercite(env=env, dim=self.get_rep().get_dimensions())
-                return self.remove_draw(scores, new_board)
-        
-        return scores
+        board = self.get_array_board()
+        scores = board.scores_after(pos[0]*DIM + pos[1], PIECE_INDEX[piece], board.players_ids.index(id_player))
+        return dict(zip(board.players_ids, scores))
+
+    def score_delta(self, action: LightAction) -> Dict[int, int]:
+        """
+        Compute how the score of each player changes if the next player plays action, from the pieces around
+        its position only, without building the next state. On the last move, this includes the points that
+        break a draw.
+
+        Args:
+            action (LightAction): The action to evaluate.
+
+        Returns:
+            Dict[int, int]: A dictionary with player ID as the key and the points won as the value.
+        """
+        piece, position = action.data["piece"], action.data["position"]
+        board = self.get_array_board()
+        scores = board.scores_after(position[0]*DIM + position[1], PIECE_INDEX[piece], board.next_index)
+        return {player_id: scores[index] - board.scores[index] for index, player_id in enumerate(board.players_ids)}
     
     def remove_draw(self, scores: dict, board: BoardDivercite) -> Dict[int, float]:
         """
@@ -260,17 +262,17 @@ class GameStateDivercite(GameState):
             dict: The new scores of the players.
         """
         
-        d = board.get_dimensions()
         env = board.get_env()
-        
+
+        def cities(player_id: int) -> List[int]:
+            return [cell for cell in CITY_CELLS if POSITIONS[cell] in env and env[POSITIONS[cell]].get_owner_id() == player_id]
+
         def count_divercite(player_id: int) -> int:
-            return sum([self.check_divercite((i,j), board=board) for i in range(d[0]) for j in range(d[1]) 
-                        if self.in_board((i,j)) and env.get((i,j)) and env.get((i,j)).get_type()[1] == 'C' and env[(i,j)].get_owner_id() == player_id])
-            
-        
+            return sum([self.check_divercite(POSITIONS[cell], board=board) for cell in cities(player_id)])
+
         def count_nstack(player_id, n) -> int:
-            return sum([sum([p[0].get_type()[0] == env[(i,j)].get_type()[0] for p in board.get_neighbours(i,j).values() if isinstance(p[0], Piece)]) == n 
-                        for i in range(d[0]) for j in range(d[1]) if self.in_board((i,j)) and env.get((i,j)) and env.get((i,j)).get_type()[1] == 'C' and env[(i,j)].get_owner_id() == player_id])
+            return sum([sum([env[POSITIONS[m]].get_type()[0] == env[POSITIONS[cell]].get_type()[0] for m in NEIGHBOURS[cell] if POSITIONS[m] in env]) == n
+                        for cell in cities(player_id)])
         
         player1, player2 = self.players
         
@@ -307,8 +309,18 @@ class GameStateDivercite(GameState):
         Returns:
             bool: True if the position has won a divercite, False otherwise.
         """
-        neighbors = self.get_neighbours(pos[0], pos[1]) if not board else board.get_neighbours(pos[0], pos[1])
-        return len(set([n[0].get_type()[0] for n in neighbors.values() if isinstance(n[0], Piece)]).union(set([piece_color]) if piece_color else {})) == 4
+        neighbours = NEIGHBOURS[pos[0]*DIM + pos[1]]
+        if not board:
+            cells = self.get_array_board().cells
+            colors = {CODE_COLOR[cells[n]] for n in neighbours if cells[n]}
+            if piece_color:
+                colors.add(COLOR_INDEX[piece_color])
+        else:
+            env = board.get_env()
+            colors = {env[POSITIONS[n]].get_type()[0] for n in neighbours if POSITIONS[n] in env}
+            if piece_color:
+                colors.add(piece_color)
+        return len(colors) == 4
     
     
     def __str__(self) -> str:
@@ -317,7 +329,8 @@ class GameStateDivercite(GameState):
         return "The game is finished!"
 
     def to_json(self) -> str:
-        return { i:j for i,j in self.__dict__.items() if i!="_possible_light_actions" and i!="_possible_heavy_actions"}
+        return {"scores": self.scores, "next_player": self.next_player, "players": self.players, "rep": self.rep,
+                "max_step": self.max_step, "step": self.step, "players_pieces_left": self.players_pieces_left}
 
     @classmethod
     def from_json(cls,data:str,*,next_player:Optional[PlayerDivercite]=None) -> Serializable:
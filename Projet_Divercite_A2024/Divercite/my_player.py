@@ -1,3 +1,4 @@
+from array import array
 from collections import defaultdict
 from player_divercite import PlayerDivercite
 from seahorse.game.action import Action
@@ -5,12 +6,79 @@ from seahorse.game.game_state import GameState
 import time
 import heapq
 from seahorse.game.light_action import LightAction
-from board_divercite import BoardDivercite
-from typing import Dict
+from board_divercite import DIM, POSITIONS
+from array_board_divercite import PIECE_INDEX, PIECES
+from typing import Dict, Optional, Tuple
 
 MAX_DEPTH = 40
 TWO_PLY_STEP = 2
 CITIES_POS = [(1, 4), (2, 3), (2, 5), (3, 2), (3, 4), (3, 6), (4, 1), (4, 3), (4, 5), (4, 7), (5, 2), (5, 4), (5, 6), (6, 3), (6, 5), (7, 4)]
+TRANSPOSITION_TABLE_BITS = 18
+
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+class TranspositionTable:
+    """
+    Fixed-size transposition table, stored in parallel arrays indexed by the low bits of the Zobrist key.
+
+    Each slot keeps the full key, the search depth, the score, whether the score is exact or a lower or upper
+    bound, and the best move (cell * len(PIECES) + piece index, -1 if none). A new entry replaces the one in
+    its slot if the slot is empty, holds the same state, was written by an older search or is not deeper.
+    The memory used is fixed, whatever the number of states searched over a game.
+    """
+
+    def __init__(self, bits: int = TRANSPOSITION_TABLE_BITS):
+        size = 1 << bits
+        self.mask = size - 1
+        self.keys = array('Q', bytes(8 * size))
+        self.depths = array('b', [-1]) * size # -1 for an empty slot
+        self.scores = array('d', bytes(8 * size))
+        self.flags = array('b', bytes(size))
+        self.moves = array('h', [-1]) * size
+        self.generations = array('H', bytes(2 * size))
+        self.generation = 0
+
+    def new_search(self):
+        """
+        Mark the entries stored so far as older than the ones of the next search, so that they are replaced first.
+        """
+        self.generation = (self.generation + 1) & 0xFFFF
+
+    def probe(self, key: int) -> Optional[Tuple[int, float, int, int]]:
+        """
+        Look up a state.
+
+        Args:
+            key (int): The Zobrist key of the state.
+
+        Returns:
+            Optional[Tuple[int, float, int, int]]: The depth, score, bound flag and best move stored for the state,
+                                                   None if it is not in the table.
+        """
+        i = key & self.mask
+        if self.depths[i] >= 0 and self.keys[i] == key:
+            return self.depths[i], self.scores[i], self.flags[i], self.moves[i]
+        return None
+
+    def store(self, key: int, depth: int, score: float, flag: int, move: int):
+        """
+        Store the result of the search of a state, if the replacement policy allows it.
+        """
+        i = key & self.mask
+        if self.depths[i] < 0 or self.keys[i] == key or self.generations[i] != self.generation or depth >= self.depths[i]:
+            self.keys[i] = key
+            self.depths[i] = depth
+            self.scores[i] = score
+            self.flags[i] = flag
+            self.moves[i] = move
+            self.generations[i] = self.generation
+
+def encode_move(action: LightAction) -> int:
+    position = action.data["position"]
+    return (position[0]*DIM + position[1]) * len(PIECES) + PIECE_INDEX[action.data["piece"]]
+
+def decode_move(move: int) -> LightAction:
+    return LightAction({"piece": PIECES[move % len(PIECES)], "position": POSITIONS[move // len(PIECES)]})
 
 class MyPlayer(PlayerDivercite):
     """
@@ -30,7 +98,7 @@ class MyPlayer(PlayerDivercite):
             time_limit (float, optional): the time limit in (s)
         """
         super().__init__(piece_type, name)
-        self._transposition_table = {}
+        self._transposition_table = TranspositionTable()
         self._timeout = 0
         self._number_of_remaining_moves = 20
         self._time_allocation = {
@@ -80,6 +148,7 @@ class MyPlayer(PlayerDivercite):
 
         action = None
         self._timeout = time.time() + (self._time_allocation[ self._number_of_remaining_moves] * 60)- 0.5
+        self._transposition_table.new_search()
 
         for depth in range(1, MAX_DEPTH + 1, TWO_PLY_STEP):
             if time.time() > self._timeout:
@@ -96,8 +165,10 @@ class MyPlayer(PlayerDivercite):
 
         This function implements a recursive depth-limited minimax search with 
         alpha-beta pruning to determine the best action for the current player 
-        in the given game state. It uses a transposition table to store previously 
-        evaluated states, improving search efficiency by avoiding redundant calculations.
+        in the given game state. It uses a transposition table, keyed on the Zobrist
+        key of the states, to reuse previous searches: an entry deep enough returns
+        its score if it is exact or if its bound is outside the window (alpha, beta),
+        and its best move is searched first otherwise.
 
         Args:
             state (GameState): The current game state.
@@ -113,23 +184,37 @@ class MyPlayer(PlayerDivercite):
         """
 
         self._handle_phase_change(state)
-        if hash(state) in self._transposition_table:
-            stored_depth, stored_score = self._transposition_table[hash(state)]['depth'], self._transposition_table[hash(state)]['score']
+        key = state.get_zobrist_key()
+        entry = self._transposition_table.probe(key)
+        stored_move = -1
+        if entry is not None:
+            stored_depth, stored_score, flag, stored_move = entry
             if stored_depth >= depth:
-                return stored_score, None
+                stored_action = decode_move(stored_move) if stored_move >= 0 else None
+                if flag == EXACT:
+                    return stored_score, stored_action
+                if flag == LOWER_BOUND and stored_score >= beta:
+                    return stored_score, stored_action
+                if flag == UPPER_BOUND and stored_score <= alpha:
+                    return stored_score, stored_action
 
         if depth == 0 or state.is_done():
             score = self._evaluate_board(state)
-            self._transposition_table[hash(state)] = {'depth': depth, 'score': score}
+            self._transposition_table.store(key, depth, score, EXACT, -1)
             return score, None
-        
+
+        original_alpha, original_beta = alpha, beta
         bestMove = None
+        # In the late phase, the leaves below are evaluated from their score delta, without building them
+        leaves = depth == 1 and self.phase == 'LATE'
         if maximizing:
             maxEval = float('-inf')
             actions = self._generate_heap_light_action(state, is_max_heap=True)
-            while len(actions) > 0 and time.time() < self._timeout:
-                action = heapq.heappop(actions)[2]
-                score, _ = self._minimax(action.get_heavy_action(state).get_next_game_state(), depth - 1, alpha, beta, False)
+            for action in self._ordered_actions(actions, stored_move):
+                if leaves:
+                    score = self._evaluate_late_action(state, action)
+                else:
+                    score, _ = self._minimax(action.get_heavy_action(state).get_next_game_state(), depth - 1, alpha, beta, False)
                 if score > maxEval:
                     maxEval = score
                     bestMove = action
@@ -139,20 +224,15 @@ class MyPlayer(PlayerDivercite):
                     maxEval = score
                     bestMove = action
                     break # pruning
-
-            if bestMove is None:
-                bestMove = heapq.heappop(actions)[2]
-                maxEval = self._evaluate_board(bestMove.get_heavy_action(state).get_next_game_state())
-
-            self._transposition_table[hash(state)] = {'depth': depth, 'score': maxEval}    
-            return maxEval, bestMove
-        
+            best = maxEval
         else:
             minEval = float('inf')
             actions = self._generate_heap_light_action(state, is_max_heap=False)
-            while len(actions) > 0 and time.time() < self._timeout:
-                action = heapq.heappop(actions)[2]
-                score, _ = self._minimax(action.get_heavy_action(state).get_next_game_state(), depth - 1, alpha, beta, True)
+            for action in self._ordered_actions(actions, stored_move):
+                if leaves:
+                    score = self._evaluate_late_action(state, action)
+                else:
+                    score, _ = self._minimax(action.get_heavy_action(state).get_next_game_state(), depth - 1, alpha, beta, True)
                 if score < minEval:
                     minEval = score
                     bestMove = action
@@ -162,13 +242,45 @@ class MyPlayer(PlayerDivercite):
                     minEval = score
                     bestMove = action
                     break # pruning
-                    
+            best = minEval
+
+        if time.time() >= self._timeout:
+            # The search was cut short: its result is not stored
             if bestMove is None:
                 bestMove = heapq.heappop(actions)[2]
-                minEval = self._evaluate_board(bestMove.get_heavy_action(state).get_next_game_state())
-            
-            self._transposition_table[hash(state)] = {'depth': depth, 'score': minEval}
-            return minEval, bestMove
+                best = self._evaluate_board(bestMove.get_heavy_action(state).get_next_game_state())
+            return best, bestMove
+
+        if best <= original_alpha:
+            flag = UPPER_BOUND
+        elif best >= original_beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self._transposition_table.store(key, depth, best, flag, encode_move(bestMove) if bestMove is not None else -1)
+        return best, bestMove
+
+    def _ordered_actions(self, actions: list, stored_move: int):
+        """
+        Yield the actions of a heap built by _generate_heap_light_action, the best move stored in the
+        transposition table first if it is one of them, while there is time left.
+
+        Args:
+            actions (list): The heap of actions, emptied as the actions are yielded.
+            stored_move (int): The encoded best move of the transposition table entry, -1 if none.
+        """
+        first = None
+        if stored_move >= 0:
+            for _, _, action in actions:
+                if encode_move(action) == stored_move:
+                    first = action
+                    break
+        if first is not None and time.time() < self._timeout:
+            yield first
+        while len(actions) > 0 and time.time() < self._timeout:
+            action = heapq.heappop(actions)[2]
+            if action is not first:
+                yield action
 
     def _generate_heap_light_action(self, state: GameState, is_max_heap: bool) -> list:
         """
@@ -176,7 +288,8 @@ class MyPlayer(PlayerDivercite):
 
         This function creates a heap data structure containing all possible 
         `LightAction`s for the current player in the given game state. Each action 
-        is associated with a score calculated by the `_evaluate_board` heuristic. 
+        is associated with the change of the score difference it brings, computed 
+        with `score_delta` without building the next state. 
 
         The heap is sorted based on these scores, allowing efficient retrieval of 
         the highest-priority (for maximizing player) or lowest-priority (for 
@@ -197,22 +310,12 @@ class MyPlayer(PlayerDivercite):
         """
 
         heap = []
-        current_rep = state.get_rep()
-        b = current_rep.get_env()
-        d = current_rep.get_dimensions()
-        free_positions = self._get_free_positions(b, d)
         multiplicator = -1 if is_max_heap else 1
-        for piece, n_piece in state.players_pieces_left[state.next_player.get_id()].items():
-            piece_color = piece[0]
-            piece_res_city = piece[1]
-            if n_piece > 0:
-                for i, j in free_positions:
-                    if state.in_board((i, j)) and (i,j) not in b and state.piece_type_match(piece_res_city, (i, j)):
-                        data = {"piece": piece_color+piece_res_city, "position" : (i,j)}
-                        action = LightAction(data)
-                        new_state = state.apply_action(action)
-                        score = self._evaluate_board(new_state)
-                        heapq.heappush(heap, (multiplicator * score, id(action), action))
+        id_opponent = self._get_opponent_id(state)
+        for action in state.generate_possible_light_actions():
+            delta = state.score_delta(action)
+            score = delta[self.get_id()] - delta[id_opponent]
+            heapq.heappush(heap, (multiplicator * score, id(action), action))
         return heap
 
     def _evaluate_board(self, state: GameState) -> int:
@@ -247,22 +350,6 @@ class MyPlayer(PlayerDivercite):
         keys = list(state.scores.keys())
         return keys[1] if keys[0] == self.get_id() else keys[0]
     
-    def _get_free_positions(self, b, d):
-        """
-        Get the free positions on the board.
-
-        Args:
-            b (Dict): The board data.
-            d (Tuple): The board dimensions.
-
-        Returns:
-            List[Tuple[int, int]]: A list of free positions on the board.
-        """
-
-        board = BoardDivercite(env=b, dim=d)
-        grid_data = board.get_grid()
-        return [(i, j) for i, row in enumerate(grid_data) for j, cell in enumerate(row) if (cell == ('◇ ', 'Black') or cell == ('▢ ', 'Black'))]
-    
     def _get_score_difference(self, state: GameState) -> int:
         """
         Calculate the difference between the player's score and the opponent's score.
@@ -355,6 +442,26 @@ class MyPlayer(PlayerDivercite):
         else:
             return self._get_score_difference(state)
 
+    def _evaluate_late_action(self, state: GameState, action: LightAction) -> int:
+        """
+        Evaluate the game state reached by playing action in the late game phase, as
+        _evaluate_late does, from the score delta of the action when it does not end
+        the game.
+
+        Args:
+            state (GameState): The current game state, in the late game phase.
+            action (LightAction): The action to evaluate.
+
+        Returns:
+            int: The evaluation score of the next state.
+        """
+
+        if state.get_step() + 1 == state.max_step:
+            return self._evaluate_late(state.apply_action(action))
+        delta = state.score_delta(action)
+        id_opponent = self._get_opponent_id(state)
+        return self._get_score_difference(state) + delta[self.get_id()] - delta[id_opponent]
+
     def _verify_variety(self, state: GameState) -> int:
         """
         Evaluate the balance and variety of resources and cities used by the player.